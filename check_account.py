@@ -1,35 +1,33 @@
-import os
+import sys
 from dotenv import load_dotenv
 load_dotenv()
 
-import schwabdev
+from app.api.schwab import SchwabApi
+from app.models.config import load_config
 
-client = schwabdev.Client(
-    app_key=os.getenv("SCHWAB_APP_KEY"),
-    app_secret=os.getenv("SCHWAB_APP_SECRET"),
-    callback_url=os.getenv("CALLBACK_URL"),
-    tokens_db=os.getenv("TOKENS_DB", "/data/tokens.db"),
-    timeout=int(os.getenv("SCHWAB_TIMEOUT", 10))
-)
+client = SchwabApi(load_config()).client
 
 # Get all account details with positions
 resp = client.account_details_all(fields="positions")
 resp.raise_for_status()
 accounts = resp.json()
 
-print("=" * 70)
-print("CURRENT POSITIONS FROM SCHWAB ACCOUNT")
-print("=" * 70)
+# Collect the report and write it in one go instead of a print() per row
+lines = [
+    "=" * 70,
+    "CURRENT POSITIONS FROM SCHWAB ACCOUNT",
+    "=" * 70,
+]
 
 for account in accounts:
     positions = account.get("securitiesAccount", {}).get("positions", [])
     
     if not positions:
-        print("No open positions found.")
+        lines.append("No open positions found.")
         continue
     
-    print(f"\n{'Symbol':<20} {'Type':<10} {'Qty':<8} {'Avg Price':<12} {'Market Val':<12}")
-    print("-" * 70)
+    lines.append(f"\n{'Symbol':<20} {'Type':<10} {'Qty':<8} {'Avg Price':<12} {'Market Val':<12}")
+    lines.append("-" * 70)
     
     total_value = 0
     for pos in positions:
@@ -40,10 +38,11 @@ for account in accounts:
         avg_price = pos.get("averagePrice", 0)
         market_val = pos.get("marketValue", 0)
         total_value += market_val
-        
-        print(f"{symbol:<20} {asset_type:<10} {qty:<8.0f} ${avg_price:<11.2f} ${market_val:<11.2f}")
+
+        lines.append(f"{symbol:<20} {asset_type:<10} {qty:<8.0f} ${avg_price:<11.2f} ${market_val:<11.2f}")
     
-    print("-" * 70)
-    print(f"{'TOTAL':<20} {'':<10} {'':<8} {'':<12} ${total_value:<11.2f}")
+    lines.append("-" * 70)
+    lines.append(f"{'TOTAL':<20} {'':<10} {'':<8} {'':<12} ${total_value:<11.2f}")
 
-print("\n" + "=" * 70)
+lines.append("\n" + "=" * 70)
+sys.stdout.write("\n".join(lines) + "\n")
@@ -1,32 +1,37 @@
 import sqlite3
+import sys
+
+from app.db.connection import tune_connection
+from app.db.trades_db import init_trades_db
+
 conn = sqlite3.connect('/data/trades.db')
+tune_connection(conn)
+# Idempotent; adds the is_sell column on a DB the bot hasn't migrated yet
+init_trades_db('/data/trades.db', conn)
 
+# Pivot bought/sold per symbol in one pass; only symbols with contracts left
 cursor = conn.execute('''
-    SELECT symbol, instruction, SUM(filled_quantity) as total_qty
+    SELECT symbol,
+           SUM(CASE WHEN instruction LIKE '%BUY%' THEN filled_quantity ELSE 0 END) AS bought,
+           SUM(CASE WHEN is_sell = 1 THEN filled_quantity ELSE 0 END) AS sold
     FROM trades
-    GROUP BY symbol, instruction
+    GROUP BY symbol
+    HAVING bought != sold
     ORDER BY symbol
 ''')
 
-positions = {}
-for symbol, instruction, qty in cursor.fetchall():
-    if symbol not in positions:
-        positions[symbol] = {'bought': 0, 'sold': 0}
-    
-    if 'BUY' in instruction.upper():
-        positions[symbol]['bought'] += qty
-    elif 'SELL' in instruction.upper():
-        positions[symbol]['sold'] += qty
-
-print('Symbol     | Bought | Sold | Remaining')
-print('-' * 45)
+# Collect the report and write it in one go instead of a print() per row
+lines = [
+    'Symbol     | Bought | Sold | Remaining',
+    '-' * 45,
+]
 total_remaining = 0
-for symbol, pos in sorted(positions.items()):
-    remaining = pos['bought'] - pos['sold']
-    if remaining != 0:
-        print(f"{symbol:10} | {pos['bought']:6.0f} | {pos['sold']:4.0f} | {remaining:9.0f}")
-        total_remaining += remaining
+for symbol, bought, sold in cursor:
+    remaining = bought - sold
+    lines.append(f"{symbol:10} | {bought:6.0f} | {sold:4.0f} | {remaining:9.0f}")
+    total_remaining += remaining
 
-print('-' * 45)
-print(f'Total open positions: {total_remaining:.0f}')
+lines.append('-' * 45)
+lines.append(f'Total open positions: {total_remaining:.0f}')
+sys.stdout.write('\n'.join(lines) + '\n')
 conn.close()
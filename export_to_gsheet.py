@@ -9,11 +9,14 @@ import os
 import sqlite3
 import logging
 from datetime import datetime
+from functools import lru_cache
 from dotenv import load_dotenv
 
 load_dotenv()
 
-from app.cost_basis import parse_strike_display, parse_expiration
+from app.cost_basis import parse_option_description, parse_strike_display
+from app.db.connection import tune_connection
+from app.db.trades_db import init_trades_db
 from app.gsheet import connect_to_sheet, append_rows, get_existing_entries
 
 logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
@@ -28,6 +31,9 @@ SPREADSHEET_ID = os.environ.get(
 )
 WORKSHEET_NAME = os.environ.get("GOOGLE_SHEETS_WORKSHEET_NAME", "Sheet1")
 
+# Bound once so per-row formatting skips re-parsing the format spec
+_FORMAT_PCT = "{:.2f}%".format
+
 
 def get_month_date_range(year: int, month: int):
     """Get start and end date strings for a given month."""
@@ -39,10 +45,22 @@ def get_month_date_range(year: int, month: int):
     return start, end
 
 
+@lru_cache(maxsize=4096)
 def format_date_mmdd(date_str: str) -> str:
-    """Convert ISO date string to MM/DD format."""
+    """Convert ISO date string to MM/DD format.
+
+    Cached: trades closed on the same order share a close_time, and the
+    duplicate filter calls this once per candidate row.
+    """
     if not date_str:
         return ""
+
+    # Fast path for canonical ISO strings (YYYY-MM-DD...): just slice out month and day
+    if len(date_str) >= 10 and date_str[4] == "-" and date_str[7] == "-":
+        month, day = date_str[5:7], date_str[8:10]
+        if month.isdigit() and day.isdigit():
+            return f"{month}/{day}"
+
     try:
         # Handle ISO format: 2025-06-09T14:30:00+0000
         dt = datetime.fromisoformat(date_str.replace("+0000", "+00:00").replace("Z", "+00:00"))
@@ -72,10 +90,34 @@ def format_percentage(gain_pct: float) -> str:
     """Format gain percentage for display."""
     if gain_pct is None:
         return ""
-    return f"{gain_pct:.2f}%"
+    return _FORMAT_PCT(gain_pct)
+
+
+def _load_synced_keys(conn: sqlite3.Connection, keys: set) -> None:
+    """
+    Load the sheet's existing (date, ticker, contract) keys into a temp table.
+
+    Also registers the SQL functions used to build the same key from a trade row,
+    so duplicates can be filtered inside the query.
+    """
+    conn.create_function("mmdd", 1, format_date_mmdd, deterministic=True)
+    conn.create_function("strike_display", 1, parse_strike_display, deterministic=True)
+
+    # Composite key stored clustered (WITHOUT ROWID), so each probe is a single
+    # B-tree lookup and the sheet's tuples go in as-is without string joins
+    with conn:
+        conn.execute("""
+            CREATE TEMP TABLE IF NOT EXISTS synced (
+                posted TEXT, ticker TEXT, contract TEXT,
+                PRIMARY KEY (posted, ticker, contract)
+            ) WITHOUT ROWID
+        """)
+        conn.execute("DELETE FROM synced")
+        conn.executemany("INSERT OR IGNORE INTO synced VALUES (?, ?, ?)", keys)
 
 
-def get_completed_trades(conn: sqlite3.Connection, year: int = None, month: int = None, start_date: str = None, end_date: str = None) -> list:
+def get_completed_trades(conn: sqlite3.Connection, year: int = None, month: int = None, start_date: str = None,
+                         end_date: str = None, exclude_keys: set = None) -> list:
     """
     Get completed trades (with FIFO matches) from database.
 
@@ -83,69 +125,52 @@ def get_completed_trades(conn: sqlite3.Connection, year: int = None, month: int
         conn: SQLite connection
         year, month: Optional month filter
         start_date, end_date: Optional date range filter (ISO format YYYY-MM-DD)
+        exclude_keys: Optional set of (Posted Date, Ticker, Contract) keys already in the sheet
 
     Returns list of dicts with: close_time, description, underlying, entry, exit, gain_pct
     """
+    # Lot matches only exist for sells; the flag lets the close_time range use idx_trades_sell_close
+    conditions = ["t.is_sell = 1"]
+    params = []
+
     if start_date and end_date:
         # Use explicit date range
-        cursor = conn.execute("""
-            SELECT
-                t.close_time,
-                t.description,
-                c.underlying,
-                m.cost_basis AS entry,
-                m.sell_price AS exit_price,
-                m.gain_pct
-            FROM lot_matches m
-            JOIN trades t ON t.order_id = m.sell_order_id
-            JOIN cost_basis_lots c ON c.lot_id = m.lot_id
-            WHERE t.close_time >= ? AND t.close_time < ?
-            ORDER BY t.close_time ASC
-        """, (start_date, end_date))
+        conditions.append("t.close_time >= ? AND t.close_time < ?")
+        params.extend((start_date, end_date))
     elif year and month:
-        start, end = get_month_date_range(year, month)
-        cursor = conn.execute("""
-            SELECT
-                t.close_time,
-                t.description,
-                c.underlying,
-                m.cost_basis AS entry,
-                m.sell_price AS exit_price,
-                m.gain_pct
-            FROM lot_matches m
-            JOIN trades t ON t.order_id = m.sell_order_id
-            JOIN cost_basis_lots c ON c.lot_id = m.lot_id
-            WHERE t.close_time >= ? AND t.close_time < ?
-            ORDER BY t.close_time ASC
-        """, (start, end))
-    else:
-        cursor = conn.execute("""
-            SELECT
-                t.close_time,
-                t.description,
-                c.underlying,
-                m.cost_basis AS entry,
-                m.sell_price AS exit_price,
-                m.gain_pct
-            FROM lot_matches m
-            JOIN trades t ON t.order_id = m.sell_order_id
-            JOIN cost_basis_lots c ON c.lot_id = m.lot_id
-            ORDER BY t.close_time ASC
-        """)
-
-    trades = []
-    for row in cursor.fetchall():
-        close_time, description, underlying, entry, exit_price, gain_pct = row
-        trades.append({
-            "close_time": close_time,
-            "description": description,
-            "underlying": underlying,
-            "entry": entry,
-            "exit": exit_price,
-            "gain_pct": gain_pct,
-        })
-
-    return trades
+        conditions.append("t.close_time >= ? AND t.close_time < ?")
+        params.extend(get_month_date_range(year, month))
+
+    if exclude_keys:
+        _load_synced_keys(conn, exclude_keys)
+        conditions.append("""NOT EXISTS (
+                SELECT 1 FROM synced s
+                WHERE s.posted = mmdd(t.close_time)
+                  AND s.ticker = c.underlying
+                  AND s.contract = strike_display(t.description)
+            )""")
+
+    where = " AND ".join(conditions)
+
+    # sqlite3.Row lets each row become the trade dict directly, keyed by column name
+    cursor = conn.cursor()
+    cursor.row_factory = sqlite3.Row
+    cursor.execute(f"""
+        SELECT
+            t.close_time,
+            t.description,
+            c.underlying,
+            m.cost_basis AS entry,
+            m.sell_price AS "exit",
+            m.gain_pct
+        FROM lot_matches m
+        JOIN trades t ON t.order_id = m.sell_order_id
+        JOIN cost_basis_lots c ON c.lot_id = m.lot_id
+        WHERE {where}
+        ORDER BY t.close_time ASC
+    """, params)
+
+    return [dict(row) for row in cursor]
 
 
 def format_trade_row(trade: dict) -> list:
@@ -154,13 +179,13 @@ def format_trade_row(trade: dict) -> list:
 
     Columns: Posted Date | Ticker | Exp. | Contract | Entry | Max Exit | % | Win/Loss | SIZING
     """
-    description = trade.get("description", "")
+    expiration, contract = parse_option_description(trade.get("description", ""))
 
     return [
         format_date_mmdd(trade.get("close_time", "")),  # Posted Date (MM/DD)
         trade.get("underlying", ""),                     # Ticker
-        parse_expiration(description),                   # Exp.
-        parse_strike_display(description),               # Contract (e.g., "84c")
+        expiration,                                      # Exp.
+        contract,                                        # Contract (e.g., "84c")
         trade.get("entry", ""),                          # Entry
         trade.get("exit", ""),                           # Max Exit / Stop Price
         format_percentage(trade.get("gain_pct")),        # Max Exit / Stop Price Percentage
@@ -187,18 +212,6 @@ def export_to_gsheet(year: int = None, month: int = None):
         print(f"ERROR: Database not found at {DB_PATH}")
         return
 
-    conn = sqlite3.connect(DB_PATH)
-
-    # Get completed trades
-    trades = get_completed_trades(conn, year, month)
-    conn.close()
-
-    if not trades:
-        print(f"No completed trades found for {month_name}")
-        return
-
-    print(f"Found {len(trades)} completed trades")
-
     # Connect to Google Sheets
     if not os.path.exists(CREDENTIALS_PATH):
         print(f"ERROR: Credentials file not found at {CREDENTIALS_PATH}")
@@ -215,29 +228,25 @@ def export_to_gsheet(year: int = None, month: int = None):
     existing = get_existing_entries(worksheet)
     print(f"Found {len(existing)} existing entries in sheet")
 
-    # Format rows and filter duplicates
-    new_rows = []
-    skipped = 0
-
-    for trade in trades:
-        row = format_trade_row(trade)
-        # Check for duplicate: (Posted Date, Ticker, Contract)
-        key = (row[0], row[1], row[3])
-        if key in existing:
-            skipped += 1
-            continue
-        new_rows.append(row)
-
-    if not new_rows:
-        print(f"No new trades to add (skipped {skipped} duplicates)")
+    # Get completed trades not yet in the sheet
+    conn = sqlite3.connect(DB_PATH)
+    tune_connection(conn)
+    # Idempotent; adds the is_sell column on a DB the bot hasn't migrated yet
+    init_trades_db(DB_PATH, conn)
+    trades = get_completed_trades(conn, year, month, exclude_keys=existing)
+    conn.close()
+
+    if not trades:
+        print(f"No new completed trades to add for {month_name}")
         return
 
+    print(f"Found {len(trades)} new completed trades")
+    new_rows = [format_trade_row(trade) for trade in trades]
+
     # Append to sheet
     try:
         count = append_rows(worksheet, new_rows)
         print(f"Successfully added {count} new trades to Google Sheets")
-        if skipped:
-            print(f"Skipped {skipped} duplicates")
     except Exception as e:
         print(f"ERROR: Could not append rows: {e}")
         return
@@ -272,18 +281,6 @@ def export_weekly():
         logger.error(f"Database not found at {DB_PATH}")
         return 0
 
-    conn = sqlite3.connect(DB_PATH)
-
-    # Get completed trades for the last 7 days
-    trades = get_completed_trades(conn, start_date=start_date, end_date=end_date + "T23:59:59")
-    conn.close()
-
-    if not trades:
-        logger.info(f"No completed trades found for {start_date} to {end_date}")
-        return 0
-
-    logger.info(f"Found {len(trades)} completed trades")
-
     # Connect to Google Sheets
     if not os.path.exists(CREDENTIALS_PATH):
         logger.error(f"Credentials file not found at {CREDENTIALS_PATH}")
@@ -299,29 +296,26 @@ def export_weekly():
     existing = get_existing_entries(worksheet)
     logger.info(f"Found {len(existing)} existing entries in sheet")
 
-    # Format rows and filter duplicates
-    new_rows = []
-    skipped = 0
-
-    for trade in trades:
-        row = format_trade_row(trade)
-        # Check for duplicate: (Posted Date, Ticker, Contract)
-        key = (row[0], row[1], row[3])
-        if key in existing:
-            skipped += 1
-            continue
-        new_rows.append(row)
-
-    if not new_rows:
-        logger.info(f"No new trades to add (skipped {skipped} duplicates)")
+    # Get completed trades for the last 7 days that are not yet in the sheet
+    conn = sqlite3.connect(DB_PATH)
+    tune_connection(conn)
+    # Idempotent; adds the is_sell column on a DB the bot hasn't migrated yet
+    init_trades_db(DB_PATH, conn)
+    trades = get_completed_trades(conn, start_date=start_date, end_date=end_date + "T23:59:59",
+                                  exclude_keys=existing)
+    conn.close()
+
+    if not trades:
+        logger.info(f"No new completed trades to add for {start_date} to {end_date}")
         return 0
 
+    logger.info(f"Found {len(trades)} new completed trades")
+    new_rows = [format_trade_row(trade) for trade in trades]
+
     # Append to sheet
     try:
         count = append_rows(worksheet, new_rows)
         logger.info(f"Successfully added {count} new trades to Google Sheets")
-        if skipped:
-            logger.info(f"Skipped {skipped} duplicates")
         return count
     except Exception as e:
         logger.error(f"Could not append rows: {e}")
@@ -2,36 +2,80 @@
 """Export trades from SQLite to Excel file in data folder.
 
 Creates monthly spreadsheets named trades_YYYY-MM.xlsx to keep files manageable.
-Each month gets its own file. New trades are APPENDED to existing files (newest at bottom).
+Each month gets its own file. New trades are APPENDED to the month's ledger
+(trades_YYYY-MM.jsonl) and the spreadsheet is rebuilt from it (newest at bottom).
 """
 
 import sqlite3
 import os
+import csv
+import json
+import atexit
+import hashlib
 import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime
+from typing import Optional
 from dotenv import load_dotenv
 load_dotenv()
 
 logger = logging.getLogger(__name__)
 
-try:
-    import openpyxl
-    from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
-    from openpyxl.utils import get_column_letter
-except ImportError:
-    print("Installing openpyxl...")
-    import subprocess
-    subprocess.check_call(["pip", "install", "openpyxl"])
-    import openpyxl
-    from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
-    from openpyxl.utils import get_column_letter
+import openpyxl
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
+from openpyxl.utils import get_column_letter
 
 from app.api.positions import get_schwab_positions
-from app.db.cost_basis_db import get_avg_gain_for_sell
 from app.cost_basis import extract_underlying
+from app.db.connection import tune_connection
+from app.db.trades_db import init_trades_db
+from app.models.data import TradeSide, trade_side
 
 DB_PATH = os.environ.get("DB_PATH", "/data/trades.db")
 OUTPUT_DIR = os.environ.get("OUTPUT_DIR", "/data")
+# xlsx: styled workbook (default); csv: plain trades file only; both: write both
+EXPORT_FORMAT = os.environ.get("EXPORT_FORMAT", "xlsx").lower()
+
+# Shared cell styles; openpyxl styles are immutable, so one instance serves every cell
+HEADER_FONT = Font(bold=True, color="FFFFFFFF")
+HEADER_FILL = PatternFill(start_color="FF1F4E79", end_color="FF1F4E79", fill_type="solid")
+HEADER_ALIGN = Alignment(horizontal="center", vertical="center")
+THIN_BORDER = Border(
+    left=Side(style="thin"),
+    right=Side(style="thin"),
+    top=Side(style="thin"),
+    bottom=Side(style="thin")
+)
+CENTER_ALIGN = Alignment(horizontal="center")
+RIGHT_ALIGN = Alignment(horizontal="right")
+BUY_FILL = PatternFill(start_color="FFC6EFCE", end_color="FFC6EFCE", fill_type="solid")
+SELL_FILL = PatternFill(start_color="FFFFC7CE", end_color="FFFFC7CE", fill_type="solid")
+HIGHLIGHT_FILL = PatternFill(start_color="FFFFEB9C", end_color="FFFFEB9C", fill_type="solid")
+PROFIT_FONT = Font(color="FF006400", bold=True)
+LOSS_FONT = Font(color="FF8B0000", bold=True)
+POSITION_FONT = Font(bold=True, color="FF1F4E79")
+BOLD_FONT = Font(bold=True)
+MONEY_FORMAT = "$#,##0.00"
+PERCENT_FORMAT = "0.00%"
+
+# Trade row fill by side: green for buys, red for sells
+ROW_FILLS = {TradeSide.BUY: BUY_FILL, TradeSide.SELL: SELL_FILL}
+
+TRADE_HEADERS = [
+    "Symbol", "Asset Type", "Action", "Quantity", "Filled", "Position Left",
+    "Price", "Status", "Entry Date", "Close Date", "Notes", "P/L ($)", "Gain %"
+]
+POSITION_HEADERS = ["Symbol", "Asset Type", "Quantity", "Avg Price", "Market Value", "Status"]
+LOT_HEADERS = ["Lot ID", "Order ID", "Symbol", "Underlying", "Quantity", "Remaining",
+               "Avg Cost", "Entry Time", "Created At"]
+MATCH_HEADERS = ["Match ID", "Sell Order", "Lot ID", "Quantity", "Cost Basis",
+                 "Sell Price", "Gain %", "Gain $", "Matched At", "Symbol", "Underlying"]
+
+# Export connections by database path, reused across export_trades() calls
+_connections = {}
+_conn_lock = threading.Lock()
 
 
 def get_current_month_filter():
@@ -105,41 +149,77 @@ def get_lot_matches(conn, year: int = None, month: int = None):
         return []
 
 
-def generate_filename(year: int, month: int) -> str:
-    """Generate filename with month and year: trades_YYYY-MM.xlsx"""
-    return f"trades_{year}-{month:02d}.xlsx"
+def get_sell_gains(conn, start_date: str, end_date: str) -> dict:
+    """
+    Weighted average gain % per sell order entered in the date range.
 
+    One grouped query for the whole month instead of a lookup per sell row.
+    Returns {sell_order_id: avg_gain}; sells without lot matches are absent.
+    """
+    try:
+        cursor = conn.execute("""
+            SELECT m.sell_order_id, SUM(m.quantity * m.gain_pct) / SUM(m.quantity)
+            FROM lot_matches m
+            JOIN trades t ON t.order_id = m.sell_order_id
+            WHERE t.entered_time >= ? AND t.entered_time < ?
+            GROUP BY m.sell_order_id
+        """, (start_date, end_date))
+        return dict(cursor.fetchall())
+    except sqlite3.OperationalError as e:
+        logger.warning(f"Could not fetch sell gains (table may not exist): {e}")
+        return {}
 
-def get_existing_entry_dates(ws):
-    """Get set of entry dates already in the trades sheet (column 9 = Entry Date)."""
-    existing = set()
-    for row in range(2, ws.max_row + 1):
-        entry_date = ws.cell(row=row, column=9).value
-        if entry_date:
-            existing.add(str(entry_date))
-    return existing
 
+def load_exported_dates(conn, entry_dates: set) -> None:
+    """Load the entry dates already exported into a temp table for the trades anti-join."""
+    conn.execute("""
+        CREATE TEMP TABLE IF NOT EXISTS exported (entered_time TEXT PRIMARY KEY) WITHOUT ROWID
+    """)
+    conn.execute("DELETE FROM exported")
+    conn.executemany("INSERT OR IGNORE INTO exported VALUES (?)", ((d,) for d in entry_dates))
 
-def find_total_row(ws):
-    """Find the row with 'TOTAL P/L:' label, or return None if not found."""
-    for row in range(2, ws.max_row + 1):
-        if ws.cell(row=row, column=11).value == "TOTAL P/L:":
-            return row
-    return None
 
+def iter_trades(cursor, positions_by_symbol: dict, sell_gains: dict):
+    """
+    Yield one sheet row per trade from the trades cursor.
 
-def export_trades(year: int = None, month: int = None):
-    """Export trades to Excel. Appends new trades to existing file (newest at bottom)."""
-    # Default to current month
-    if year is None or month is None:
-        year, month = get_current_month_filter()
+    Adds the live Schwab position left for the underlying and the sell's
+    average gain %; P/L comes computed from the query. Rows are produced as
+    the cursor is read.
+    """
+    # Position left per raw symbol; a month's trades repeat a handful of contracts
+    remaining_by_symbol = {}
+
+    for row in cursor:
+        (order_id, symbol, asset_type, instruction, quantity, filled_qty, price, status,
+         entered, closed, desc, is_sell, pl) = row
 
+        # Get actual position remaining from Schwab (by underlying symbol)
+        position_remaining = remaining_by_symbol.get(symbol)
+        if position_remaining is None:
+            position_remaining = positions_by_symbol.get(extract_underlying(symbol), 0)
+            remaining_by_symbol[symbol] = position_remaining
+
+        # Get gain percentage for sell orders
+        gain_pct = sell_gains.get(order_id) if is_sell else None
+
+        yield (symbol, asset_type, instruction, quantity, filled_qty,
+               position_remaining, price, status, entered, closed, desc, pl, gain_pct)
+
+
+def read_month(conn, year: int, month: int, existing_dates: set, positions_future):
+    """
+    Read the month's export data.
+
+    positions_future resolves to get_schwab_positions(); it is only waited on
+    once the other queries have run and the trade rows need it.
+
+    Returns (new trade rows not yet in the ledger, cost basis lots, lot matches).
+    """
     start_date, end_date = get_month_date_range(year, month)
-    month_name = datetime(year, month, 1).strftime("%B %Y")
-    filename = generate_filename(year, month)
-    filepath = os.path.join(OUTPUT_DIR, filename)
 
-    conn = sqlite3.connect(DB_PATH)
+    # Trades whose entry date is already in the ledger are skipped by the query itself
+    load_exported_dates(conn, existing_dates)
 
     # Get trades for the specified month - ORDER BY ASC so newest is last
     cursor = conn.execute("""
@@ -150,358 +230,449 @@ def export_trades(year: int = None, month: int = None):
             instruction,
             quantity,
             filled_quantity,
-            remaining_quantity,
             price,
             status,
             entered_time,
             close_time,
-            description
+            description,
+            is_sell,
+            -- P/L: sells bring cash in, buys pay it out
+            CASE
+                WHEN is_sell THEN 1
+                WHEN instr(upper(instruction), 'BUY') > 0 THEN -1
+                ELSE 0
+            END
+                * COALESCE(price, 0)
+                * COALESCE(NULLIF(filled_quantity, 0), quantity)
+                * (CASE WHEN asset_type = 'OPTION' THEN 100 ELSE 1 END)
         FROM trades
         WHERE entered_time >= ? AND entered_time < ?
+          AND entered_time NOT IN (SELECT entered_time FROM exported)
         ORDER BY entered_time ASC
     """, (start_date, end_date))
-    rows = cursor.fetchall()
-
-    # Get actual positions from Schwab (always current)
-    schwab_positions, positions_by_symbol = get_schwab_positions()
 
     # Get cost basis data for this month
     cost_basis_lots = get_cost_basis_lots(conn, year, month)
     lot_matches = get_lot_matches(conn, year, month)
+    sell_gains = get_sell_gains(conn, start_date, end_date)
 
-    # Calculate P/L per trade and add position remaining
-    all_trades = []
-    for row in rows:
-        order_id, symbol, asset_type, instruction, quantity, filled_qty, remaining_qty, price, status, entered, closed, desc = row
+    _, positions_by_symbol = positions_future.result()
+    new_trades = list(iter_trades(cursor, positions_by_symbol, sell_gains))
+    return new_trades, cost_basis_lots, lot_matches
 
-        multiplier = 100 if asset_type == "OPTION" else 1
-        filled = filled_qty if filled_qty else quantity
-        trade_value = (price or 0) * filled * multiplier
 
-        if instruction and "SELL" in instruction.upper():
-            pl = trade_value
-        elif instruction and "BUY" in instruction.upper():
-            pl = -trade_value
-        else:
-            pl = 0
+def get_export_connection() -> sqlite3.Connection:
+    """
+    Return the tuned connection for DB_PATH, opening it on first use.
 
-        # Get actual position remaining from Schwab (by underlying symbol)
-        underlying = extract_underlying(symbol)
-        position_remaining = positions_by_symbol.get(underlying, 0)
+    The bot exports after every batch of new trades, so the connection is
+    kept for the life of the process. Callers hold _conn_lock while using it.
+    """
+    conn = _connections.get(DB_PATH)
+    if conn is None:
+        conn = sqlite3.connect(DB_PATH, check_same_thread=False)
+        tune_connection(conn)
+        # Idempotent; adds the is_sell column on a DB the bot hasn't migrated yet
+        init_trades_db(DB_PATH, conn)
+        _connections[DB_PATH] = conn
+    return conn
 
-        # Get gain percentage for sell orders
-        gain_pct = None
-        if instruction and "SELL" in instruction.upper():
-            gain_pct = get_avg_gain_for_sell(conn, order_id)
 
-        all_trades.append((symbol, asset_type, instruction, quantity, filled_qty,
-                           position_remaining, price, status, entered, closed, desc, pl, gain_pct))
+@atexit.register
+def close_export_connections() -> None:
+    """Close the cached export connections."""
+    for conn in _connections.values():
+        conn.close()
+    _connections.clear()
 
-    conn.close()
 
-    # Check if file exists - if so, load and append
-    file_exists = os.path.exists(filepath)
-    new_trades_count = 0
+def generate_filename(year: int, month: int) -> str:
+    """Generate filename with month and year: trades_YYYY-MM.xlsx"""
+    return f"trades_{year}-{month:02d}.xlsx"
 
-    if file_exists:
-        wb = openpyxl.load_workbook(filepath)
-        ws = wb.active
 
-        # Always remove the totals row if it exists (we'll re-add it at the end)
-        total_row = find_total_row(ws)
-        if total_row:
-            ws.delete_rows(total_row)
+def generate_ledger_filename(year: int, month: int) -> str:
+    """Generate ledger filename with month and year: trades_YYYY-MM.jsonl"""
+    return f"trades_{year}-{month:02d}.jsonl"
 
-        # Get existing entry dates to avoid duplicates
-        existing_dates = get_existing_entry_dates(ws)
 
-        # Filter to only new trades
-        new_trades = [t for t in all_trades if str(t[8]) not in existing_dates]
-        new_trades_count = len(new_trades)
-        trades_with_pl = new_trades
-    else:
-        # Create new workbook
-        wb = openpyxl.Workbook()
-        trades_with_pl = all_trades
-        new_trades_count = len(all_trades)
-
-    # Style settings
-    header_font = Font(bold=True, color="FFFFFF")
-    header_fill = PatternFill(start_color="1F4E79", end_color="1F4E79", fill_type="solid")
-    header_align = Alignment(horizontal="center", vertical="center")
-    thin_border = Border(
-        left=Side(style="thin"),
-        right=Side(style="thin"),
-        top=Side(style="thin"),
-        bottom=Side(style="thin")
-    )
-    buy_fill = PatternFill(start_color="C6EFCE", end_color="C6EFCE", fill_type="solid")
-    sell_fill = PatternFill(start_color="FFC7CE", end_color="FFC7CE", fill_type="solid")
-    profit_font = Font(color="006400", bold=True)
-    loss_font = Font(color="8B0000", bold=True)
-
-    headers = [
-        "Symbol", "Asset Type", "Action", "Quantity", "Filled", "Position Left",
-        "Price", "Status", "Entry Date", "Close Date", "Notes", "P/L ($)", "Gain %"
-    ]
+def read_ledger(path: str) -> list:
+    """Read the month's exported trade rows, one JSON array per line."""
+    with open(path, encoding="utf-8") as f:
+        return [tuple(json.loads(line)) for line in f if line.strip()]
 
-    # ===== SHEET 1: Monthly Trades =====
-    ws = wb.active
-
-    if not file_exists:
-        # New file - set up headers
-        ws.title = f"Trades {month_name}"
-        for col, header in enumerate(headers, 1):
-            cell = ws.cell(row=1, column=col, value=header)
-            cell.font = header_font
-            cell.fill = header_fill
-            cell.alignment = header_align
-            cell.border = thin_border
-        start_row = 2
+
+def write_ledger(path: str, rows, mode: str = "a") -> None:
+    """Write trade rows to the ledger; appends by default."""
+    with open(path, mode, encoding="utf-8") as f:
+        f.writelines(json.dumps(row) + "\n" for row in rows)
+
+
+def generate_csv_filename(year: int, month: int) -> str:
+    """Generate CSV filename with month and year: trades_YYYY-MM.csv"""
+    return f"trades_{year}-{month:02d}.csv"
+
+
+def write_trades_csv(path: str, all_trades: list, new_trades: list) -> None:
+    """Write the month's trades as plain CSV.
+
+    An existing file only gets the new rows appended; a missing one is written
+    in full with a header row.
+    """
+    if os.path.exists(path):
+        rows, mode = new_trades, "a"
     else:
-        # Existing file - find where to append
-        start_row = ws.max_row + 1 if trades_with_pl else ws.max_row
-
-    # Add new trades
-    for idx, row in enumerate(trades_with_pl):
-        row_idx = start_row + idx
-        for col_idx, value in enumerate(row, 1):
-            cell = ws.cell(row=row_idx, column=col_idx, value=value)
-            cell.border = thin_border
-            cell.alignment = Alignment(horizontal="center")
-
-            # Position Left column - highlight if > 0
-            if col_idx == 6 and value and value > 0:
-                cell.font = Font(bold=True, color="1F4E79")
-
-            # P/L column
-            if col_idx == 12:
-                cell.number_format = "$#,##0.00"
-                if value and value > 0:
-                    cell.font = profit_font
-                elif value and value < 0:
-                    cell.font = loss_font
-
-            # Gain % column
-            if col_idx == 13 and value is not None:
-                cell.number_format = "0.00%"
-                cell.value = value / 100 if value else 0  # Convert to decimal for %
-                if value and value > 0:
-                    cell.font = profit_font
-                elif value and value < 0:
-                    cell.font = loss_font
-
-        action = row[2] if row[2] else ""
-        if "BUY" in action.upper():
-            for col in range(1, len(headers) + 1):
-                if col not in (6, 12, 13):
-                    ws.cell(row=row_idx, column=col).fill = buy_fill
-        elif "SELL" in action.upper():
-            for col in range(1, len(headers) + 1):
-                if col not in (6, 12, 13):
-                    ws.cell(row=row_idx, column=col).fill = sell_fill
-
-    # Calculate total P/L from ALL rows in sheet (not just new ones)
-    total_pl = 0
-    for row in range(2, ws.max_row + 1):
-        pl_val = ws.cell(row=row, column=12).value
-        if pl_val and isinstance(pl_val, (int, float)):
-            total_pl += pl_val
+        rows, mode = all_trades, "w"
+    if not rows and mode == "a":
+        return
+    with open(path, mode, newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        if mode == "w":
+            writer.writerow(TRADE_HEADERS)
+        writer.writerows(rows)
 
-    # Add totals row at the end
-    if ws.max_row > 1:
-        total_row_num = ws.max_row + 1
-        ws.cell(row=total_row_num, column=11, value="TOTAL P/L:").font = Font(bold=True)
-        ws.cell(row=total_row_num, column=11).alignment = Alignment(horizontal="right")
-        total_cell = ws.cell(row=total_row_num, column=12, value=total_pl)
-        total_cell.number_format = "$#,##0.00"
-        total_cell.font = Font(bold=True, color="006400" if total_pl >= 0 else "8B0000")
-        total_cell.border = thin_border
-
-    # Auto-size columns
-    for col in range(1, len(headers) + 1):
-        max_length = len(headers[col-1])
-        for row in range(2, ws.max_row + 1):
-            cell_value = ws.cell(row=row, column=col).value
-            if cell_value:
-                max_length = max(max_length, len(str(cell_value)))
-        ws.column_dimensions[get_column_letter(col)].width = min(max_length + 2, 30)
 
+def generate_digest_filename(year: int, month: int) -> str:
+    """Generate the filename holding the last export's content digest."""
+    return f"trades_{year}-{month:02d}.digest"
+
+
+def export_digest(*sections) -> str:
+    """Digest of the data a workbook is built from; equal digests mean an identical workbook."""
+    return hashlib.blake2b(repr(sections).encode(), digest_size=16).hexdigest()
+
+
+def read_digest(path: str) -> Optional[str]:
+    """Read the stored digest, or None if there is none yet."""
+    try:
+        with open(path, encoding="utf-8") as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        return None
+
+
+def write_digest(path: str, digest: str) -> None:
+    """Store the digest of the workbook just written."""
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(digest)
+
+
+def read_legacy_workbook(filepath: str) -> list:
+    """
+    Read trade rows from a spreadsheet written before the ledger existed.
+
+    Skips the totals row and converts Gain % back from the stored fraction.
+    """
+    wb = openpyxl.load_workbook(filepath, read_only=True)
+    try:
+        rows = []
+        for row in wb.worksheets[0].iter_rows(min_row=2, max_col=len(TRADE_HEADERS), values_only=True):
+            if row[10] == "TOTAL P/L:" or not any(row):
+                continue
+            gain = row[12] * 100 if row[12] else row[12]
+            rows.append(row[:12] + (gain,))
+        return rows
+    finally:
+        wb.close()
+
+
+def styled_cell(ws, value=None, **styles):
+    """Create a cell for ws.append(); works for both write-only and regular sheets."""
+    cell = WriteOnlyCell(ws, value=value)
+    for name, style in styles.items():
+        setattr(cell, name, style)
+    return cell
+
+
+def header_row(ws, headers):
+    """Build the styled header row for a sheet."""
+    return [styled_cell(ws, header, font=HEADER_FONT, fill=HEADER_FILL,
+                        alignment=HEADER_ALIGN, border=THIN_BORDER)
+            for header in headers]
+
+
+def gain_font(value):
+    """Green for gains, red for losses, default otherwise."""
+    if value and value > 0:
+        return PROFIT_FONT
+    if value and value < 0:
+        return LOSS_FONT
+    return None
+
+
+def column_widths(headers, rows, padding: int, limit: int):
+    """Width per column from the longest header or value, capped at limit."""
+    widths = [len(header) for header in headers]
+    for row in rows:
+        for col, value in enumerate(row):
+            if value:
+                widths[col] = max(widths[col], len(str(value)))
+    return [min(width + padding, limit) for width in widths]
+
+
+def set_column_widths(ws, widths):
+    """Apply column widths (must happen before the first append in write-only mode)."""
+    for col, width in enumerate(widths, 1):
+        ws.column_dimensions[get_column_letter(col)].width = width
+
+
+def start_sheet(ws, headers, widths):
+    """Set widths and frozen header pane, then write the header row.
+
+    Write-only sheets need widths and panes before the first row goes out.
+    """
+    set_column_widths(ws, widths)
     ws.freeze_panes = "A2"
+    ws.append(header_row(ws, headers))
 
-    # ===== SHEET 2: Open Positions (from Schwab API - always current) =====
-    # This sheet is always replaced with current data
-    if "Open Positions" in wb.sheetnames:
-        del wb["Open Positions"]
-    ws2 = wb.create_sheet("Open Positions")
 
-    pos_headers = ["Symbol", "Asset Type", "Quantity", "Avg Price", "Market Value", "Status"]
+def trade_row(ws, trade):
+    """Build the styled cells for one trade row on the trades sheet."""
+    row_fill = ROW_FILLS.get(trade_side(trade[2]))
 
-    for col, header in enumerate(pos_headers, 1):
-        cell = ws2.cell(row=1, column=col, value=header)
-        cell.font = header_font
-        cell.fill = header_fill
-        cell.alignment = header_align
-        cell.border = thin_border
+    cells = []
+    for col_idx, value in enumerate(trade, 1):
+        cell = styled_cell(ws, value, border=THIN_BORDER, alignment=CENTER_ALIGN)
 
-    row_idx = 2
-    total_qty = 0
-    total_value = 0
+        # Position Left column - highlight if > 0
+        if col_idx == 6:
+            if value and value > 0:
+                cell.font = POSITION_FONT
 
-    for pos in schwab_positions:
-        ws2.cell(row=row_idx, column=1, value=pos["symbol"]).border = thin_border
-        ws2.cell(row=row_idx, column=2, value=pos["asset_type"]).border = thin_border
+        # P/L column
+        elif col_idx == 12:
+            cell.number_format = MONEY_FORMAT
+            font = gain_font(value)
+            if font:
+                cell.font = font
 
-        qty_cell = ws2.cell(row=row_idx, column=3, value=pos["quantity"])
-        qty_cell.border = thin_border
-        qty_cell.font = Font(bold=True)
+        # Gain % column
+        elif col_idx == 13:
+            if value is not None:
+                cell.number_format = PERCENT_FORMAT
+                cell.value = value / 100 if value else 0  # Convert to decimal for %
+                font = gain_font(value)
+                if font:
+                    cell.font = font
 
-        price_cell = ws2.cell(row=row_idx, column=4, value=pos["avg_price"])
-        price_cell.border = thin_border
-        price_cell.number_format = "$#,##0.00"
+        elif row_fill:
+            cell.fill = row_fill
 
-        val_cell = ws2.cell(row=row_idx, column=5, value=pos["market_value"])
-        val_cell.border = thin_border
-        val_cell.number_format = "$#,##0.00"
+        cells.append(cell)
+    return cells
 
-        status_cell = ws2.cell(row=row_idx, column=6, value="OPEN - TO SELL")
-        status_cell.border = thin_border
-        status_cell.fill = PatternFill(start_color="FFEB9C", end_color="FFEB9C", fill_type="solid")
-        status_cell.font = Font(bold=True)
 
-        for col in range(1, 6):
-            ws2.cell(row=row_idx, column=col).alignment = Alignment(horizontal="center")
+def total_row(ws, label_col: int, label: str, value_col: int, value, font):
+    """Build a totals row: right-aligned bold label followed by a money cell."""
+    cells = [None] * value_col
+    cells[label_col - 1] = styled_cell(ws, label, font=BOLD_FONT, alignment=RIGHT_ALIGN)
+    cells[value_col - 1] = styled_cell(ws, value, font=font, border=THIN_BORDER,
+                                       number_format=MONEY_FORMAT)
+    return cells
 
-        total_qty += pos["quantity"]
-        total_value += pos["market_value"]
-        row_idx += 1
 
-    # Total row
-    if schwab_positions:
-        ws2.cell(row=row_idx + 1, column=2, value="TOTAL:").font = Font(bold=True)
-        ws2.cell(row=row_idx + 1, column=2).alignment = Alignment(horizontal="right")
+def write_trades_sheet(ws, trades):
+    """Fill the monthly trades sheet. Returns the total P/L."""
+    start_sheet(ws, TRADE_HEADERS, column_widths(TRADE_HEADERS, trades, 2, 30))
 
-        ws2.cell(row=row_idx + 1, column=3, value=total_qty).font = Font(bold=True, color="1F4E79")
-        ws2.cell(row=row_idx + 1, column=3).border = thin_border
+    total_pl = 0
+    for trade in trades:
+        ws.append(trade_row(ws, trade))
+        total_pl += trade[11]
 
-        total_val_cell = ws2.cell(row=row_idx + 1, column=5, value=total_value)
-        total_val_cell.font = Font(bold=True, color="1F4E79")
-        total_val_cell.border = thin_border
-        total_val_cell.number_format = "$#,##0.00"
+    # Add totals row at the end
+    if trades:
+        ws.append(total_row(ws, 11, "TOTAL P/L:", 12, total_pl,
+                            PROFIT_FONT if total_pl >= 0 else LOSS_FONT))
 
-    for col in range(1, len(pos_headers) + 1):
-        max_length = len(pos_headers[col-1])
-        for row in range(2, row_idx):
-            cell_value = ws2.cell(row=row, column=col).value
-            if cell_value:
-                max_length = max(max_length, len(str(cell_value)))
-        ws2.column_dimensions[get_column_letter(col)].width = min(max_length + 3, 25)
+    return total_pl
 
-    ws2.freeze_panes = "A2"
 
-    # ===== SHEET 3: Cost Basis Lots (this month) =====
-    # This sheet is always replaced with current data
-    if "Cost Basis Lots" in wb.sheetnames:
-        del wb["Cost Basis Lots"]
-    ws3 = wb.create_sheet("Cost Basis Lots")
+def write_positions_sheet(ws, schwab_positions):
+    """Fill the Open Positions sheet. Returns (total_qty, total_value)."""
+    rows = [(pos["symbol"], pos["asset_type"], pos["quantity"], pos["avg_price"],
+             pos["market_value"], "OPEN - TO SELL") for pos in schwab_positions]
+    start_sheet(ws, POSITION_HEADERS, column_widths(POSITION_HEADERS, rows, 3, 25))
 
-    lot_headers = ["Lot ID", "Order ID", "Symbol", "Underlying", "Quantity", "Remaining",
-                   "Avg Cost", "Entry Time", "Created At"]
+    total_qty = 0
+    total_value = 0
+    for symbol, asset_type, quantity, avg_price, market_value, status in rows:
+        ws.append([
+            styled_cell(ws, symbol, border=THIN_BORDER, alignment=CENTER_ALIGN),
+            styled_cell(ws, asset_type, border=THIN_BORDER, alignment=CENTER_ALIGN),
+            styled_cell(ws, quantity, border=THIN_BORDER, alignment=CENTER_ALIGN, font=BOLD_FONT),
+            styled_cell(ws, avg_price, border=THIN_BORDER, alignment=CENTER_ALIGN,
+                        number_format=MONEY_FORMAT),
+            styled_cell(ws, market_value, border=THIN_BORDER, alignment=CENTER_ALIGN,
+                        number_format=MONEY_FORMAT),
+            styled_cell(ws, status, border=THIN_BORDER, fill=HIGHLIGHT_FILL, font=BOLD_FONT),
+        ])
+        total_qty += quantity
+        total_value += market_value
 
-    for col, header in enumerate(lot_headers, 1):
-        cell = ws3.cell(row=1, column=col, value=header)
-        cell.font = header_font
-        cell.fill = header_fill
-        cell.alignment = header_align
-        cell.border = thin_border
+    # Total row, one blank row below the positions
+    if rows:
+        ws.append([])
+        totals = total_row(ws, 2, "TOTAL:", 5, total_value, POSITION_FONT)
+        totals[2] = styled_cell(ws, total_qty, font=POSITION_FONT, border=THIN_BORDER)
+        ws.append(totals)
 
-    for row_idx, lot in enumerate(cost_basis_lots, 2):
-        for col_idx, value in enumerate(lot, 1):
-            cell = ws3.cell(row=row_idx, column=col_idx, value=value)
-            cell.border = thin_border
-            cell.alignment = Alignment(horizontal="center")
+    return total_qty, total_value
 
-            # Avg Cost column
-            if col_idx == 7:
-                cell.number_format = "$#,##0.00"
 
-            # Remaining qty - highlight if > 0
-            if col_idx == 6 and value and value > 0:
-                cell.font = Font(bold=True, color="1F4E79")
-                cell.fill = PatternFill(start_color="FFEB9C", end_color="FFEB9C", fill_type="solid")
+def write_lots_sheet(ws, cost_basis_lots):
+    """Fill the Cost Basis Lots sheet."""
+    start_sheet(ws, LOT_HEADERS, [15] * len(LOT_HEADERS))
 
-    for col in range(1, len(lot_headers) + 1):
-        ws3.column_dimensions[get_column_letter(col)].width = 15
+    for lot in cost_basis_lots:
+        cells = [styled_cell(ws, value, border=THIN_BORDER, alignment=CENTER_ALIGN) for value in lot]
 
-    ws3.freeze_panes = "A2"
+        # Avg Cost column
+        cells[6].number_format = MONEY_FORMAT
 
-    # ===== SHEET 4: Lot Matches (FIFO Sales - this month) =====
-    # This sheet is always replaced with current data
-    if "FIFO Matches" in wb.sheetnames:
-        del wb["FIFO Matches"]
-    ws4 = wb.create_sheet("FIFO Matches")
+        # Remaining qty - highlight if > 0
+        if lot[5] and lot[5] > 0:
+            cells[5].font = POSITION_FONT
+            cells[5].fill = HIGHLIGHT_FILL
 
-    match_headers = ["Match ID", "Sell Order", "Lot ID", "Quantity", "Cost Basis",
-                     "Sell Price", "Gain %", "Gain $", "Matched At", "Symbol", "Underlying"]
+        ws.append(cells)
 
-    for col, header in enumerate(match_headers, 1):
-        cell = ws4.cell(row=1, column=col, value=header)
-        cell.font = header_font
-        cell.fill = header_fill
-        cell.alignment = header_align
-        cell.border = thin_border
+
+def write_matches_sheet(ws, lot_matches):
+    """Fill the FIFO Matches sheet. Returns the total realized gain."""
+    start_sheet(ws, MATCH_HEADERS, [15] * len(MATCH_HEADERS))
 
     total_gain = 0
-    for row_idx, match in enumerate(lot_matches, 2):
-        for col_idx, value in enumerate(match, 1):
-            cell = ws4.cell(row=row_idx, column=col_idx, value=value)
-            cell.border = thin_border
-            cell.alignment = Alignment(horizontal="center")
-
-            # Cost Basis and Sell Price columns
-            if col_idx in (5, 6):
-                cell.number_format = "$#,##0.00"
-
-            # Gain % column
-            if col_idx == 7:
-                cell.number_format = "0.00%"
-                cell.value = value / 100 if value else 0
-                if value and value > 0:
-                    cell.font = profit_font
-                elif value and value < 0:
-                    cell.font = loss_font
-
-            # Gain $ column
-            if col_idx == 8:
-                cell.number_format = "$#,##0.00"
-                if value and value > 0:
-                    cell.font = profit_font
-                elif value and value < 0:
-                    cell.font = loss_font
-
-        if match[7]:  # gain_amount
-            total_gain += match[7]
+    for match in lot_matches:
+        cells = [styled_cell(ws, value, border=THIN_BORDER, alignment=CENTER_ALIGN) for value in match]
+
+        # Cost Basis and Sell Price columns
+        cells[4].number_format = MONEY_FORMAT
+        cells[5].number_format = MONEY_FORMAT
+
+        # Gain % column
+        gain_pct = match[6]
+        cells[6].number_format = PERCENT_FORMAT
+        cells[6].value = gain_pct / 100 if gain_pct else 0
+        font = gain_font(gain_pct)
+        if font:
+            cells[6].font = font
+
+        # Gain $ column
+        gain_amount = match[7]
+        cells[7].number_format = MONEY_FORMAT
+        font = gain_font(gain_amount)
+        if font:
+            cells[7].font = font
+
+        ws.append(cells)
+
+        if gain_amount:
+            total_gain += gain_amount
 
     # Total row for matches
     if lot_matches:
-        total_row = len(lot_matches) + 2
-        ws4.cell(row=total_row, column=7, value="TOTAL GAIN:").font = Font(bold=True)
-        ws4.cell(row=total_row, column=7).alignment = Alignment(horizontal="right")
-        gain_cell = ws4.cell(row=total_row, column=8, value=total_gain)
-        gain_cell.number_format = "$#,##0.00"
-        gain_cell.font = Font(bold=True, color="006400" if total_gain >= 0 else "8B0000")
-        gain_cell.border = thin_border
+        ws.append(total_row(ws, 7, "TOTAL GAIN:", 8, total_gain,
+                            PROFIT_FONT if total_gain >= 0 else LOSS_FONT))
+
+    return total_gain
+
+
+def export_trades(year: int = None, month: int = None, positions: tuple = None):
+    """Export trades to Excel. Appends new trades to the month's ledger and rebuilds the file (newest at bottom).
+
+    positions is an already-fetched get_schwab_positions() result; when omitted
+    the positions are fetched from Schwab.
+    """
+    # Default to current month
+    if year is None or month is None:
+        year, month = get_current_month_filter()
+
+    month_name = datetime(year, month, 1).strftime("%B %Y")
+    filename = generate_filename(year, month)
+    filepath = os.path.join(OUTPUT_DIR, filename)
+
+    ledger_path = os.path.join(OUTPUT_DIR, generate_ledger_filename(year, month))
+
+    # Get actual positions from Schwab (always current); the API call runs
+    # while the ledger and the database are read
+    if positions is None:
+        executor = ThreadPoolExecutor(max_workers=1)
+        positions_future = executor.submit(get_schwab_positions)
+        executor.shutdown(wait=False)
+    else:
+        positions_future = Future()
+        positions_future.set_result(positions)
+
+    # The ledger holds every trade row already exported this month
+    file_exists = os.path.exists(ledger_path) or os.path.exists(filepath)
+    if os.path.exists(ledger_path):
+        ledger = read_ledger(ledger_path)
+    elif os.path.exists(filepath):
+        # Spreadsheet from before the ledger existed: seed the ledger from it
+        ledger = read_legacy_workbook(filepath)
+        write_ledger(ledger_path, ledger, mode="w")
+    else:
+        ledger = []
+    existing_dates = {str(trade[8]) for trade in ledger}
+
+    with _conn_lock:
+        conn = get_export_connection()
+
+        # One read transaction: every query below sees the same snapshot
+        conn.execute("BEGIN")
+        try:
+            new_trades, cost_basis_lots, lot_matches = read_month(
+                conn, year, month, existing_dates, positions_future)
+        finally:
+            conn.commit()
+    schwab_positions, _ = positions_future.result()
+    new_trades_count = len(new_trades)
+
+    if new_trades:
+        write_ledger(ledger_path, new_trades)
+    trades_with_pl = ledger + new_trades
+
+    # Plain CSV streams straight from the rows, no workbook or styling involved
+    if EXPORT_FORMAT in ("csv", "both"):
+        csv_path = os.path.join(OUTPUT_DIR, generate_csv_filename(year, month))
+        write_trades_csv(csv_path, trades_with_pl, new_trades)
+        if EXPORT_FORMAT == "csv":
+            print(f"EXPORT: {month_name} - {new_trades_count} new trades, "
+                  f"{len(trades_with_pl)} total in {csv_path}")
+            return csv_path
+
+    # Skip the rebuild when nothing the workbook shows has changed since the last run
+    digest_path = os.path.join(OUTPUT_DIR, generate_digest_filename(year, month))
+    digest = export_digest(trades_with_pl, schwab_positions, cost_basis_lots, lot_matches)
+    if os.path.exists(filepath) and read_digest(digest_path) == digest:
+        print(f"EXPORT: {month_name} unchanged, skipped rebuilding {filepath}")
+        return filepath
+
+    # The workbook is rebuilt from the ledger every run; write-only mode streams
+    # rows out instead of keeping every cell in memory
+    wb = openpyxl.Workbook(write_only=True)
 
-    for col in range(1, len(match_headers) + 1):
-        ws4.column_dimensions[get_column_letter(col)].width = 15
+    # ===== SHEET 1: Monthly Trades =====
+    total_pl = write_trades_sheet(wb.create_sheet(f"Trades {month_name}"), trades_with_pl)
+
+    # ===== SHEET 2: Open Positions (from Schwab API - always current) =====
+    total_qty, total_value = write_positions_sheet(wb.create_sheet("Open Positions"), schwab_positions)
 
-    ws4.freeze_panes = "A2"
+    # ===== SHEET 3: Cost Basis Lots (this month) =====
+    write_lots_sheet(wb.create_sheet("Cost Basis Lots"), cost_basis_lots)
+
+    # ===== SHEET 4: Lot Matches (FIFO Sales - this month) =====
+    total_gain = write_matches_sheet(wb.create_sheet("FIFO Matches"), lot_matches)
 
-    # Save file
-    wb.save(filepath)
+    # Save file; write next to it and swap in, so a crash mid-save never leaves a truncated workbook
+    tmp_path = f"{filepath}.tmp"
+    wb.save(tmp_path)
+    os.replace(tmp_path, filepath)
+    write_digest(digest_path, digest)
 
     # Count total trades in sheet (excluding header and total rows)
-    total_trades_in_file = ws.max_row - 2 if ws.max_row > 2 else ws.max_row - 1
+    total_trades_in_file = len(trades_with_pl)
 
     print(f"=" * 60)
     print(f"EXPORT: {month_name}")
@@ -2,21 +2,40 @@
 """Shared module for fetching Schwab positions."""
 
 from __future__ import annotations
-import os
 import logging
+import threading
+from collections import defaultdict
 from typing import Optional, Tuple, List, Dict, Any
 
 from app.cost_basis import extract_underlying
 
 logger = logging.getLogger(__name__)
 
+# SchwabApi built from env config, created on first use and reused by later calls.
+# Exports fetch positions on a worker thread, so creation is guarded by a lock.
+_client = None
+_client_lock = threading.Lock()
+
+
+def _get_client():
+    """Return the shared SchwabApi client, creating it on first use."""
+    global _client
+
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                from app.api.schwab import SchwabApi
+                from app.models.config import load_config
+                _client = SchwabApi(load_config())
+    return _client
+
 
 def get_schwab_positions(client=None) -> Tuple[List[Dict[str, Any]], Dict[str, int]]:
     """
     Fetch current positions from Schwab account.
 
     Args:
-        client: Optional SchwabApi client. If not provided, creates one using env vars.
+        client: Optional SchwabApi client. If not provided, uses a shared one built from env vars.
 
     Returns:
         Tuple of (positions_list, positions_by_symbol_dict)
@@ -24,26 +43,16 @@ def get_schwab_positions(client=None) -> Tuple[List[Dict[str, Any]], Dict[str, i
         - positions_by_symbol: Dict mapping underlying symbol to total quantity
     """
     try:
-        # If no client provided, create one using schwabdev directly
+        # If no client provided, use the shared one built from env vars
         if client is None:
-            import schwabdev
-            client_obj = schwabdev.Client(
-                app_key=os.getenv("SCHWAB_APP_KEY"),
-                app_secret=os.getenv("SCHWAB_APP_SECRET"),
-                callback_url=os.getenv("CALLBACK_URL"),
-                tokens_db=os.getenv("TOKENS_DB", "/data/tokens.db"),
-                timeout=int(os.getenv("SCHWAB_TIMEOUT", 10))
-            )
-            resp = client_obj.account_details_all(fields="positions")
-        else:
-            # Use the provided client (SchwabApi wrapper)
-            resp = client.client.account_details_all(fields="positions")
+            client = _get_client()
+        resp = client.client.account_details_all(fields="positions")
 
         resp.raise_for_status()
         accounts = resp.json()
 
         positions = []
-        positions_by_symbol = {}
+        positions_by_symbol = defaultdict(int)
 
         for account in accounts:
             account_positions = account.get("securitiesAccount", {}).get("positions", [])
@@ -67,12 +76,10 @@ def get_schwab_positions(client=None) -> Tuple[List[Dict[str, Any]], Dict[str, i
                 })
 
                 # Build lookup by underlying symbol
-                underlying = extract_underlying(symbol)
-                if underlying not in positions_by_symbol:
-                    positions_by_symbol[underlying] = 0
-                positions_by_symbol[underlying] += qty
+                positions_by_symbol[extract_underlying(symbol)] += qty
 
-        return positions, positions_by_symbol
+        # Plain dict out, so a caller's missing-key lookup can't insert zeros
+        return positions, dict(positions_by_symbol)
 
     except Exception as e:
         logger.error(f"Error fetching positions: {e}")
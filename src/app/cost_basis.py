@@ -7,21 +7,27 @@ import sqlite3
 import logging
 from typing import Optional
 from dataclasses import dataclass
+from functools import lru_cache
 
 from app.db.cost_basis_db import (
     create_cost_basis_lot,
     get_open_lots_fifo,
-    reduce_lot_quantity,
-    record_lot_match,
-    get_avg_gain_for_sell,
-    check_sell_already_matched,
-    check_buy_already_recorded,
-    check_sell_unmatched,
+    reduce_lot_quantities,
+    record_lot_matches,
+    get_sell_match_state,
     record_unmatched_sell,
 )
 
 logger = logging.getLogger(__name__)
 
+# Option description parsing, e.g. "ORACLE CORP 02/13/2026 $149 Call"
+_EXPIRATION_RE = re.compile(r'(\d{2}/\d{2}/\d{4})')
+_OPTION_RE = re.compile(
+    r'(?P<exp>\d{2}/\d{2}/\d{4}).*?\s\$?(?P<strike>\d+(?:\.\d+)?)\s+(?P<kind>call|put)\s*$',
+    re.IGNORECASE,
+)
+_OPTION_SUFFIX = {"call": "c", "put": "p"}
+
 
 @dataclass
 class GainResult:
@@ -31,9 +37,15 @@ class GainResult:
     lots_matched: int
 
 
+@lru_cache(maxsize=8192)
 def extract_underlying(symbol: str) -> str:
-    """Extract underlying symbol from full option symbol."""
-    return symbol.split()[0] if " " in symbol else symbol
+    """Extract underlying symbol from full option symbol.
+
+    Cached: the same contracts recur across positions, lots and sells.
+    """
+    # OCC option symbols pad the root with spaces ("AAPL  260220C00267500");
+    # maxsplit=1 stops after the root, skips leading whitespace and keeps "BRK.B"-style roots
+    return symbol.split(None, 1)[0] if " " in symbol else symbol
 
 
 def process_buy_order(conn: sqlite3.Connection, order_id: int, symbol: str,
@@ -41,11 +53,8 @@ def process_buy_order(conn: sqlite3.Connection, order_id: int, symbol: str,
     """
     Process a BUY order and create a cost basis lot.
     Returns True if a new lot was created, False if already exists.
+    Does not commit; the caller commits once per batch of orders.
     """
-    if check_buy_already_recorded(conn, order_id):
-        logger.debug(f"Buy order {order_id} already recorded as lot")
-        return False
-
     underlying = extract_underlying(symbol)
     lot_id = create_cost_basis_lot(
         conn=conn,
@@ -56,6 +65,10 @@ def process_buy_order(conn: sqlite3.Connection, order_id: int, symbol: str,
         avg_cost=price,
         entered_time=entered_time
     )
+    if lot_id is None:
+        logger.debug(f"Buy order {order_id} already recorded as lot")
+        return False
+
     logger.info(f"Created cost basis lot {lot_id} for {symbol}: {filled_quantity} @ ${price}")
     return True
 
@@ -65,16 +78,17 @@ def process_sell_order(conn: sqlite3.Connection, order_id: int, symbol: str,
     """
     Process a SELL order using FIFO matching against open lots.
     Returns GainResult with average gain %, or None if no lots to match.
+    Does not commit; the caller commits once per batch of orders.
     """
-    if check_sell_already_matched(conn, order_id):
+    # One probe answers both "already matched" and "already recorded as unmatched";
+    # every match has a positive quantity, so matched sells have a stored average gain
+    avg_gain, unmatched = get_sell_match_state(conn, order_id)
+    if avg_gain is not None:
         # Already matched, just return the stored average gain
-        avg_gain = get_avg_gain_for_sell(conn, order_id)
-        if avg_gain is not None:
-            return GainResult(avg_gain_pct=avg_gain, total_gain_amount=0, lots_matched=0)
-        return None
+        return GainResult(avg_gain_pct=avg_gain, total_gain_amount=0, lots_matched=0)
 
-    # Check if we already recorded this as unmatched (no lots available)
-    if check_sell_unmatched(conn, order_id):
+    # Already recorded as unmatched (no lots available)
+    if unmatched:
         return None
 
     underlying = extract_underlying(symbol)
@@ -86,6 +100,7 @@ def process_sell_order(conn: sqlite3.Connection, order_id: int, symbol: str,
         return None
 
     remaining_to_sell = filled_quantity
+    matches = []
     total_gain_amount = 0.0
     total_weighted_gain = 0.0
     total_qty_matched = 0.0
@@ -111,20 +126,7 @@ def process_sell_order(conn: sqlite3.Connection, order_id: int, symbol: str,
         else:
             gain_pct = 0.0
 
-        # Record the match
-        record_lot_match(
-            conn=conn,
-            sell_order_id=order_id,
-            lot_id=lot_id,
-            quantity=qty_from_lot,
-            cost_basis=lot_cost,
-            sell_price=sell_price,
-            gain_pct=gain_pct,
-            gain_amount=gain_amount
-        )
-
-        # Reduce the lot
-        reduce_lot_quantity(conn, lot_id, qty_from_lot)
+        matches.append((lot_id, qty_from_lot, lot_cost, sell_price, gain_pct, gain_amount))
 
         # Accumulate for weighted average
         total_weighted_gain += gain_pct * qty_from_lot
@@ -135,7 +137,9 @@ def process_sell_order(conn: sqlite3.Connection, order_id: int, symbol: str,
 
         logger.info(f"Matched {qty_from_lot} from lot {lot_id} (cost ${lot_cost}) -> {gain_pct:.2f}% gain")
 
-    conn.commit()
+    # Record the matches and reduce the lots, one statement each for the whole sell
+    record_lot_matches(conn, order_id, matches)
+    reduce_lot_quantities(conn, [(match[1], match[0]) for match in matches])
 
     if total_qty_matched > 0:
         avg_gain_pct = total_weighted_gain / total_qty_matched
@@ -148,9 +152,25 @@ def process_sell_order(conn: sqlite3.Connection, order_id: int, symbol: str,
     return None
 
 
-def get_gain_for_order(conn: sqlite3.Connection, order_id: int) -> Optional[float]:
-    """Get the average gain percentage for a sell order (if already matched)."""
-    return get_avg_gain_for_sell(conn, order_id)
+def parse_option_description(description: str) -> tuple[str, str]:
+    """
+    Parse expiration and strike display from an option description in one pass.
+
+    Input format: "ORACLE CORP 02/13/2026 $149 Call"
+    Output: ("02/13/2026", "149c")
+
+    Falls back to parse_expiration/parse_strike_display for descriptions
+    that don't follow the standard layout.
+    """
+    if not description:
+        return "N/A", "N/A"
+
+    match = _OPTION_RE.search(description)
+    if match is None:
+        return parse_expiration(description), parse_strike_display(description)
+
+    suffix = _OPTION_SUFFIX[match["kind"].lower()]
+    return match["exp"], f"{match['strike']}{suffix}"
 
 
 def parse_strike_display(description: str) -> str:
@@ -168,18 +188,12 @@ def parse_strike_display(description: str) -> str:
         return description
 
     # Last word is Call/Put, second-to-last is strike (with $ prefix)
-    option_type = parts[-1].lower()
-    strike_raw = parts[-2] if len(parts) >= 2 else "?"
+    suffix = _OPTION_SUFFIX.get(parts[-1].lower())
+    if suffix is None:
+        return description
 
     # Remove $ prefix if present
-    strike = strike_raw.lstrip('$')
-
-    if option_type == "call":
-        return f"{strike}c"
-    elif option_type == "put":
-        return f"{strike}p"
-    else:
-        return description
+    return f"{parts[-2].lstrip('$')}{suffix}"
 
 
 def parse_expiration(description: str) -> str:
@@ -193,7 +207,7 @@ def parse_expiration(description: str) -> str:
         return "N/A"
 
     # Look for date pattern MM/DD/YYYY in the description
-    date_match = re.search(r'(\d{2}/\d{2}/\d{4})', description)
+    date_match = _EXPIRATION_RE.search(description)
     if date_match:
         return date_match.group(1)
 
@@ -30,9 +30,13 @@ def init_cost_basis_db(db_path: str, conn: Optional[sqlite3.Connection] = None)
             )
         """)
 
+        # Open lots only, already in FIFO order: a sell's lot lookup reads them
+        # straight off the index with no sort, and closed lots drop out of it
+        conn.execute("DROP INDEX IF EXISTS idx_lots_underlying_remaining")
         conn.execute("""
-            CREATE INDEX IF NOT EXISTS idx_lots_underlying_remaining
-            ON cost_basis_lots(underlying, remaining_qty)
+            CREATE INDEX IF NOT EXISTS idx_lots_open_fifo
+            ON cost_basis_lots(underlying, entered_time)
+            WHERE remaining_qty > 0
         """)
 
         conn.execute("""
@@ -62,6 +66,11 @@ def init_cost_basis_db(db_path: str, conn: Optional[sqlite3.Connection] = None)
             ON lot_matches(sell_order_id)
         """)
 
+        conn.execute("""
+            CREATE INDEX IF NOT EXISTS idx_matches_matched_at
+            ON lot_matches(matched_at)
+        """)
+
         # Table to track sell orders with no matching lots (to avoid repeated warnings)
         conn.execute("""
             CREATE TABLE IF NOT EXISTS unmatched_sells (
@@ -81,8 +90,8 @@ def init_cost_basis_db(db_path: str, conn: Optional[sqlite3.Connection] = None)
 
 def create_cost_basis_lot(conn: sqlite3.Connection, order_id: int, symbol: str,
                           underlying: str, quantity: float, avg_cost: float,
-                          entered_time: str) -> int:
-    """Create a new cost basis lot from a BUY order."""
+                          entered_time: str) -> Optional[int]:
+    """Create a new cost basis lot from a BUY order; returns None if the order already has one."""
     now = datetime.now(timezone.utc).isoformat()
 
     cursor = conn.execute("""
@@ -91,8 +100,8 @@ def create_cost_basis_lot(conn: sqlite3.Connection, order_id: int, symbol: str,
         VALUES (?, ?, ?, ?, ?, ?, ?, ?)
     """, (order_id, symbol, underlying, quantity, quantity, avg_cost, entered_time, now))
 
-    conn.commit()
-    return cursor.lastrowid
+    # order_id is UNIQUE, so an already-recorded buy is ignored and changes no rows
+    return cursor.lastrowid if cursor.rowcount else None
 
 
 def get_open_lots_fifo(conn: sqlite3.Connection, underlying: str) -> list:
@@ -106,73 +115,63 @@ def get_open_lots_fifo(conn: sqlite3.Connection, underlying: str) -> list:
     return cursor.fetchall()
 
 
-def reduce_lot_quantity(conn: sqlite3.Connection, lot_id: int, sold_qty: float) -> None:
-    """Reduce remaining quantity in a lot after a sale."""
-    conn.execute("""
+def reduce_lot_quantities(conn: sqlite3.Connection, reductions: list) -> None:
+    """Reduce remaining quantity in lots after a sale; reductions are (sold_qty, lot_id) pairs."""
+    conn.executemany("""
         UPDATE cost_basis_lots
         SET remaining_qty = remaining_qty - ?
         WHERE lot_id = ?
-    """, (sold_qty, lot_id))
+    """, reductions)
+
 
+def record_lot_matches(conn: sqlite3.Connection, sell_order_id: int, matches: list) -> None:
+    """
+    Record the FIFO matches between a sell order and its cost basis lots.
 
-def record_lot_match(conn: sqlite3.Connection, sell_order_id: int, lot_id: int,
-                     quantity: float, cost_basis: float, sell_price: float,
-                     gain_pct: float, gain_amount: float) -> int:
-    """Record a FIFO match between a sell order and a cost basis lot."""
+    matches holds (lot_id, quantity, cost_basis, sell_price, gain_pct, gain_amount) tuples.
+    """
     now = datetime.now(timezone.utc).isoformat()
 
-    cursor = conn.execute("""
+    conn.executemany("""
         INSERT INTO lot_matches
         (sell_order_id, lot_id, quantity, cost_basis, sell_price, gain_pct, gain_amount, matched_at)
         VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-    """, (sell_order_id, lot_id, quantity, cost_basis, sell_price, gain_pct, gain_amount, now))
-
-    return cursor.lastrowid
-
+    """, [(sell_order_id, *match, now) for match in matches])
 
-def get_matches_for_sell(conn: sqlite3.Connection, sell_order_id: int) -> list:
-    """Get all lot matches for a sell order."""
-    cursor = conn.execute("""
-        SELECT match_id, lot_id, quantity, cost_basis, sell_price, gain_pct, gain_amount
-        FROM lot_matches
-        WHERE sell_order_id = ?
-    """, (sell_order_id,))
-    return cursor.fetchall()
 
+def get_sell_averages(conn: sqlite3.Connection, sell_order_id: int) -> tuple[Optional[float], Optional[float]]:
+    """
+    Get quantity-weighted average gain % and entry price for a sell order in one query.
 
-def get_avg_gain_for_sell(conn: sqlite3.Connection, sell_order_id: int) -> Optional[float]:
-    """Get weighted average gain percentage for a sell order."""
+    Returns (None, None) if the sell has no lot matches.
+    """
     cursor = conn.execute("""
-        SELECT SUM(quantity * gain_pct) / SUM(quantity) as avg_gain
+        SELECT
+            SUM(quantity * gain_pct) / SUM(quantity),
+            SUM(quantity * cost_basis) / SUM(quantity)
         FROM lot_matches
         WHERE sell_order_id = ?
+        HAVING SUM(quantity) > 0
     """, (sell_order_id,))
     result = cursor.fetchone()
-    return result[0] if result and result[0] is not None else None
-
-
-def check_sell_already_matched(conn: sqlite3.Connection, sell_order_id: int) -> bool:
-    """Check if a sell order has already been matched."""
-    cursor = conn.execute("""
-        SELECT COUNT(*) FROM lot_matches WHERE sell_order_id = ?
-    """, (sell_order_id,))
-    return cursor.fetchone()[0] > 0
+    return (result[0], result[1]) if result else (None, None)
 
 
-def check_buy_already_recorded(conn: sqlite3.Connection, order_id: int) -> bool:
-    """Check if a buy order has already been recorded as a lot."""
-    cursor = conn.execute("""
-        SELECT COUNT(*) FROM cost_basis_lots WHERE order_id = ?
-    """, (order_id,))
-    return cursor.fetchone()[0] > 0
+def get_sell_match_state(conn: sqlite3.Connection, sell_order_id: int) -> tuple[Optional[float], bool]:
+    """
+    Get what is already recorded for a sell order in one query.
 
-
-def check_sell_unmatched(conn: sqlite3.Connection, sell_order_id: int) -> bool:
-    """Check if a sell order was already recorded as having no matching lots."""
+    Returns (weighted average gain %, or None if the sell has no lot matches;
+    whether it was recorded as having no matching lots).
+    """
     cursor = conn.execute("""
-        SELECT COUNT(*) FROM unmatched_sells WHERE sell_order_id = ?
-    """, (sell_order_id,))
-    return cursor.fetchone()[0] > 0
+        SELECT
+            (SELECT SUM(quantity * gain_pct) / SUM(quantity)
+             FROM lot_matches WHERE sell_order_id = ?),
+            EXISTS (SELECT 1 FROM unmatched_sells WHERE sell_order_id = ?)
+    """, (sell_order_id, sell_order_id))
+    avg_gain, unmatched = cursor.fetchone()
+    return avg_gain, bool(unmatched)
 
 
 def record_unmatched_sell(conn: sqlite3.Connection, sell_order_id: int, symbol: str,
@@ -184,4 +183,3 @@ def record_unmatched_sell(conn: sqlite3.Connection, sell_order_id: int, symbol:
         (sell_order_id, symbol, quantity, sell_price, recorded_at)
         VALUES (?, ?, ?, ?, ?)
     """, (sell_order_id, symbol, quantity, sell_price, now))
-    conn.commit()
@@ -9,13 +9,14 @@ def get_unposted_trade_ids(conn: sqlite3.Connection) -> List[str]:
     """
     Returns all trade_ids that are marked as unposted in trade_state.
     """
-    rows = conn.execute(
+    # Read ids straight off the cursor rather than materializing the row tuples first
+    cursor = conn.execute(
         """
         SELECT s.trade_id
         FROM trade_state s
         WHERE s.posted = 0
         ORDER BY s.updated_at ASC;
         """
-    ).fetchall()
+    )
 
-    return [r[0] for r in rows]
+    return [r[0] for r in cursor]
@@ -21,7 +21,8 @@ def _apply_pragmas(conn: sqlite3.Connection) -> None:
 
 
 def _add_column_if_missing(conn: sqlite3.Connection, table_name: str, column_name: str, column_type: str) -> None:
-    cursor = conn.execute(f"PRAGMA table_info({table_name})")
+    # table_xinfo (unlike table_info) also lists generated columns
+    cursor = conn.execute(f"PRAGMA table_xinfo({table_name})")
     columns = [col[1] for col in cursor.fetchall()]
     if column_name not in columns:
         conn.execute(f"ALTER TABLE {table_name} ADD COLUMN {column_name} {column_type}")
@@ -79,9 +80,29 @@ def init_trades_db(db_path: str, conn: Optional[sqlite3.Connection] = None) -> N
               ON trades(symbol, entered_time);
             """
         )
+
+        # Month range scans in the Excel export filter on entered_time alone
+        conn.execute(
+            """
+            CREATE INDEX IF NOT EXISTS idx_trades_entered
+              ON trades(entered_time);
+            """
+        )
         _add_column_if_missing(conn, "trades", "description", "TEXT")
         _add_column_if_missing(conn, "trades", "underlying", "TEXT")
 
+        # Indexable sell flag: instruction LIKE '%SELL%' can't use an index
+        _add_column_if_missing(
+            conn, "trades", "is_sell",
+            "INTEGER GENERATED ALWAYS AS (instr(upper(instruction), 'SELL') > 0) VIRTUAL",
+        )
+        conn.execute(
+            """
+            CREATE INDEX IF NOT EXISTS idx_trades_sell_close
+              ON trades(is_sell, close_time);
+            """
+        )
+
         conn.commit()
     finally:
         if should_close:
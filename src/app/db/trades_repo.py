@@ -15,15 +15,16 @@ def make_trade_id(order_id: int) -> str:
     return f"schwab-order:{order_id}"
 
 
-def store_trade(conn: sqlite3.Connection, trade) -> str:
+def store_trades(conn: sqlite3.Connection, trades: list, now: Optional[str] = None) -> list[str]:
     """
-    Stores the trade dataclass into `trades` (raw, no cleaning).
-    `trade` is your existing Trade dataclass instance.
-    Returns trade_id.
+    Stores Trade dataclass instances into `trades` (raw, no cleaning), one upsert batch.
+    `now` is the ingestion timestamp shared by the batch.
+    Returns the trade_ids in the same order.
     """
-    trade_id = make_trade_id(trade.order_id)
+    now = now or _now_iso()
+    trade_ids = [make_trade_id(trade.order_id) for trade in trades]
 
-    conn.execute(
+    conn.executemany(
         """
         INSERT INTO trades (
         trade_id,
@@ -53,45 +54,50 @@ def store_trade(conn: sqlite3.Connection, trade) -> str:
         close_time = excluded.close_time,
         ingested_at = excluded.ingested_at;
         """,
-        (
-            trade_id,
-            trade.order_id,
-            trade.symbol,
-            trade.underlying,
-            trade.asset_type,
-            trade.instruction,
-            trade.description,          # now matches a column
-            trade.quantity,
-            trade.filled_quantity,
-            trade.remaining_quantity,
-            trade.price,
-            trade.status,
-            trade.entered_time,
-            trade.close_time,
-            _now_iso(),
-        ),
+        [
+            (
+                trade_id,
+                trade.order_id,
+                trade.symbol,
+                trade.underlying,
+                trade.asset_type,
+                trade.instruction,
+                trade.description,          # now matches a column
+                trade.quantity,
+                trade.filled_quantity,
+                trade.remaining_quantity,
+                trade.price,
+                trade.status,
+                trade.entered_time,
+                trade.close_time,
+                now,
+            )
+            for trade_id, trade in zip(trade_ids, trades)
+        ],
     )
 
 
-    return trade_id
+    return trade_ids
 
 
-def ensure_trade_state(conn: sqlite3.Connection, trade_id: str) -> None:
+def ensure_trade_states(conn: sqlite3.Connection, trade_ids: list[str], now: Optional[str] = None) -> None:
     """
-    Creates state row if missing. Leaves future fields NULL.
+    Creates state rows for any trade_ids missing one. Leaves future fields NULL.
     """
-    conn.execute(
+    now = now or _now_iso()
+    conn.executemany(
         """
         INSERT OR IGNORE INTO trade_state (
           trade_id, posted, posted_at, discord_message_id, open_qty, updated_at
         )
         VALUES (?, 0, NULL, NULL, NULL, ?);
         """,
-        (trade_id, _now_iso()),
+        [(trade_id, now) for trade_id in trade_ids],
     )
 
 
 def mark_posted(conn: sqlite3.Connection, trade_id: str, discord_message_id: Optional[str] = None) -> None:
+    now = _now_iso()
     cur = conn.execute(
         """
         UPDATE trade_state
@@ -101,32 +107,22 @@ def mark_posted(conn: sqlite3.Connection, trade_id: str, discord_message_id: Opt
             updated_at = ?
         WHERE trade_id = ?;
         """,
-        (_now_iso(), discord_message_id, _now_iso(), trade_id),
+        (now, discord_message_id, now, trade_id),
     )
     if cur.rowcount != 1:
         raise RuntimeError(f"mark_posted updated {cur.rowcount} rows for trade_id={trade_id}")
 
-def load_trade_from_db(conn: sqlite3.Connection, trade_id: str) -> Optional[Trade]:
-    """
-    Loads a Trade dataclass from the `trades` table using trade_id.
-    Returns None if not found.
-    """
-    row = conn.execute(
-        """
-        SELECT
+_TRADE_COLUMNS = """
           order_id, symbol, underlying, asset_type, instruction, description,
           quantity, filled_quantity, remaining_quantity,
           price, status,
-          entered_time, close_time
-        FROM trades
-        WHERE trade_id = ?;
-        """,
-        (trade_id,),
-    ).fetchone()
+          entered_time, close_time"""
+
+# Ids per IN (...) query; stays under SQLite's bound-parameter limit on older builds
+_LOAD_CHUNK_SIZE = 500
 
-    if row is None:
-        return None
 
+def _row_to_trade(row: tuple) -> Trade:
     return Trade(
         order_id=row[0],
         symbol=row[1],
@@ -143,3 +139,25 @@ def load_trade_from_db(conn: sqlite3.Connection, trade_id: str) -> Optional[Trad
         close_time=row[12],
     )
 
+
+def load_trades_from_db(conn: sqlite3.Connection, trade_ids: list[str]) -> dict[str, Trade]:
+    """
+    Loads Trade dataclasses for many trade_ids with IN (...) queries instead of one per id.
+    Returns {trade_id: Trade}; ids not found are left out.
+    """
+    trades = {}
+    for start in range(0, len(trade_ids), _LOAD_CHUNK_SIZE):
+        chunk = trade_ids[start:start + _LOAD_CHUNK_SIZE]
+        placeholders = ", ".join("?" * len(chunk))
+        cursor = conn.execute(
+            f"""
+            SELECT trade_id, {_TRADE_COLUMNS}
+            FROM trades
+            WHERE trade_id IN ({placeholders});
+            """,
+            chunk,
+        )
+        for row in cursor:
+            trades[row[0]] = _row_to_trade(row[1:])
+    return trades
+
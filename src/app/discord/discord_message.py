@@ -2,7 +2,8 @@ from __future__ import annotations
 
 from typing import Optional
 
-from app.cost_basis import parse_strike_display, parse_expiration
+from app.cost_basis import parse_option_description
+from app.models.data import TradeSide
 
 
 def build_option_bot_message(trade, position_left: int = 0, total_sold: int = 0,
@@ -14,14 +15,11 @@ def build_option_bot_message(trade, position_left: int = 0, total_sold: int = 0,
     BUY orders show: quantity bought, filled, owned
     SELL orders show: quantity sold, filled, left to sell, gain %
     """
-    description = trade.description or ""
-    strike = parse_strike_display(description)
-    expiration = parse_expiration(description)
+    expiration, strike = parse_option_description(trade.description or "")
     price = getattr(trade, "price", "N/A")
     filled = int(trade.filled_quantity) if trade.filled_quantity else 0
 
-    instruction = trade.instruction or ""
-    is_buy = "BUY" in instruction.upper()
+    is_buy = trade.side is TradeSide.BUY
 
     lines = [
         "**Option Bot**",
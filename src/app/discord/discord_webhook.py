@@ -2,13 +2,34 @@ from __future__ import annotations
 
 import json
 import logging
+import threading
 import time
+from concurrent.futures import Future, ThreadPoolExecutor
 from typing import Any, Optional
 
 import requests
+from requests.adapters import HTTPAdapter
 
 logger = logging.getLogger(__name__)
 
+# One keep-alive session per thread, so messages reuse the open TLS connection to
+# Discord instead of handshaking per request. requests.Session isn't documented as
+# thread-safe, and the caller and the worker below post at the same time.
+_local = threading.local()
+
+
+def _get_session() -> requests.Session:
+    session = getattr(_local, "session", None)
+    if session is None:
+        session = requests.Session()
+        session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=8))
+        _local.session = session
+    return session
+
+# Single worker for posts that run alongside the caller's own post; its thread is
+# started on first use and reused after that, not spawned per batch
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="discord-webhook")
+
 
 class DiscordWebhookError(RuntimeError):
     pass
@@ -39,14 +60,15 @@ def post_webhook(
         payload["avatar_url"] = avatar_url
 
     logger.debug("Posting to Discord webhook...")
-    resp = requests.post(webhook_url, json=payload, timeout=timeout)
+    session = _get_session()
+    resp = session.post(webhook_url, json=payload, timeout=timeout)
 
     if resp.status_code == 429:
         while resp.status_code == 429:
             retry_after = resp.json().get("retry_after", 5) 
             logger.warning(f"Rate limited by Discord webhook, retrying after {retry_after} seconds...")
             time.sleep(retry_after)
-            resp = requests.post(webhook_url, json=payload, timeout=timeout)
+            resp = session.post(webhook_url, json=payload, timeout=timeout)
 
     if resp.status_code < 200 or resp.status_code >= 300:
         raise DiscordWebhookError(
@@ -60,3 +82,11 @@ def post_webhook(
         body = {"raw": resp.text}
 
     return {"status_code": resp.status_code, "body": body}
+
+
+def submit_webhook(webhook_url: str, content: str, **kwargs: Any) -> Future:
+    """
+    Post to a Discord webhook on the shared background worker.
+    Returns a Future for post_webhook's result; .result() re-raises its errors.
+    """
+    return _executor.submit(post_webhook, webhook_url, content, **kwargs)
@@ -1,6 +1,6 @@
 # src/app/gsheet/__init__.py
 """Google Sheets integration module."""
 
-from .gsheet_client import connect_to_sheet, append_rows, get_existing_entries, sort_sheet_by_date
+from .gsheet_client import connect_to_sheet, append_rows, entry_key, get_existing_entries, sort_sheet_by_date
 
-__all__ = ["connect_to_sheet", "append_rows", "get_existing_entries", "sort_sheet_by_date"]
+__all__ = ["connect_to_sheet", "append_rows", "entry_key", "get_existing_entries", "sort_sheet_by_date"]
@@ -4,6 +4,7 @@
 from __future__ import annotations
 
 import logging
+import sys
 from typing import Optional
 
 import gspread
@@ -16,6 +17,22 @@ SCOPES = [
     "https://www.googleapis.com/auth/drive",
 ]
 
+# Rows per values.append request; keeps large backfills under the request size cap
+APPEND_CHUNK_SIZE = 5000
+
+# Sheet columns forming the duplicate-check key: Posted Date, Ticker, Contract
+KEY_COLUMNS = (0, 1, 3)
+
+
+def entry_key(row: list) -> tuple:
+    """
+    Build the (date, ticker, contract) duplicate-check key for a sheet row.
+
+    Dates and tickers repeat across thousands of rows, so the strings are
+    interned to share one object per distinct value.
+    """
+    return tuple(sys.intern(str(row[i])) for i in KEY_COLUMNS)
+
 
 def connect_to_sheet(
     credentials_path: str, spreadsheet_id: str, worksheet_name: str = "Sheet1"
@@ -48,17 +65,11 @@ def get_existing_entries(worksheet: gspread.Worksheet) -> set:
     Returns a set of (date, ticker, contract) tuples.
     """
     try:
-        records = worksheet.get_all_values()
-        existing = set()
+        # Only the key columns (A:D), starting below the header row. Values stay
+        # formatted so dates compare as the "MM/DD" strings we write.
+        records = worksheet.get("A2:D")
 
-        # Skip header row
-        for row in records[1:]:
-            if len(row) >= 4:
-                # (Posted Date, Ticker, Contract) as unique key
-                key = (row[0], row[1], row[3])
-                existing.add(key)
-
-        return existing
+        return {entry_key(row) for row in records if len(row) > KEY_COLUMNS[-1]}
     except Exception as e:
         logger.warning(f"Could not fetch existing entries: {e}")
         return set()
@@ -79,7 +90,9 @@ def append_rows(worksheet: gspread.Worksheet, rows: list[list]) -> int:
         logger.info("No rows to append")
         return 0
 
-    worksheet.append_rows(rows, value_input_option="USER_ENTERED")
+    # One values.append call per chunk; small exports go out in a single request
+    for start in range(0, len(rows), APPEND_CHUNK_SIZE):
+        worksheet.append_rows(rows[start:start + APPEND_CHUNK_SIZE], value_input_option="USER_ENTERED")
     logger.info(f"Appended {len(rows)} rows to sheet")
     return len(rows)
 
@@ -93,18 +106,14 @@ def sort_sheet_by_date(worksheet: gspread.Worksheet, start_row: int = 2) -> None
         start_row: First data row (after header), default 2
     """
     try:
-        # Get sheet dimensions
-        all_values = worksheet.get_all_values()
-        if len(all_values) <= 1:
+        # Sort the whole grid below the header; row_count comes from the cached
+        # sheet properties, so no values need to be read first. Blank rows sort last.
+        last_row = worksheet.row_count
+        if last_row < start_row:
             logger.info("No data to sort")
             return
 
-        # Sort range: A2 to last column/row
-        last_row = len(all_values)
-        last_col = len(all_values[0]) if all_values else 9
-
-        # Use gspread's sort method
         worksheet.sort((1, 'asc'), range=f'A{start_row}:I{last_row}')
-        logger.info(f"Sorted {last_row - start_row + 1} rows by date")
+        logger.info(f"Sorted rows {start_row}-{last_row} by date")
     except Exception as e:
         logger.error(f"Could not sort sheet: {e}")
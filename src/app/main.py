@@ -1,6 +1,8 @@
 import os
 import sqlite3
 import time
+from datetime import datetime, timezone
+from app.db.connection import tune_connection
 from app.db.trades_db import init_trades_db
 from app.db.trade_state_db import init_trade_state_db
 from app.db.cost_basis_db import init_cost_basis_db
@@ -8,12 +10,12 @@ from app.db.queries import get_unposted_trade_ids
 
 import logging
 
-from app.db.trades_repo import ensure_trade_state, load_trade_from_db, mark_posted, store_trade
+from app.db.trades_repo import ensure_trade_states, load_trades_from_db, mark_posted, store_trades
 from app.discord.discord_message import build_option_bot_message
-from app.discord.discord_webhook import post_webhook
-from app.models.data import load_trade
-from app.cost_basis import process_buy_order, process_sell_order, get_gain_for_order, extract_underlying
-from app.db.cost_basis_db import get_matches_for_sell
+from app.discord.discord_webhook import post_webhook, submit_webhook
+from app.models.data import TradeSide, load_trade
+from app.cost_basis import process_buy_order, process_sell_order, extract_underlying
+from app.db.cost_basis_db import get_sell_averages
 from app.api.positions import get_schwab_positions
 
 from .models.config import load_single_value, load_config
@@ -24,32 +26,44 @@ from export_trades import export_trades
 
 logger = logging.getLogger(__name__)
 
-def get_total_sold(conn, symbol):
-    """Get total quantity sold for an exact symbol from trade history."""
+def get_total_sold_by_symbol(conn, symbols) -> dict:
+    """Get total quantity sold per exact symbol from trade history, in one grouped query."""
+    symbols = list(symbols)
+    if not symbols:
+        return {}
     try:
-        cursor = conn.execute("""
-            SELECT SUM(filled_quantity) FROM trades
-            WHERE symbol = ? AND instruction LIKE '%SELL%'
-        """, (symbol,))
-        result = cursor.fetchone()[0]
-        return int(result) if result else 0
+        placeholders = ", ".join("?" * len(symbols))
+        cursor = conn.execute(f"""
+            SELECT symbol, SUM(filled_quantity) FROM trades
+            WHERE symbol IN ({placeholders}) AND is_sell = 1
+            GROUP BY symbol
+        """, symbols)
+        return {symbol: int(total) if total else 0 for symbol, total in cursor}
     except Exception as e:
         logger.error(f"Error getting total sold: {e}")
-        return 0
+        return {}
 
 def load_trade_orders(raw_orders=None, conn=None):
+    # One ingestion timestamp for the whole batch
+    now = datetime.now(timezone.utc).isoformat()
+
+    trades = []
     for order in raw_orders:
         logger.debug(f"loading trade: {order}")
         trade = load_trade(order)
         logger.debug(f"Loaded trade: {trade}")
+        trades.append(trade)
 
-        trade_id = store_trade(conn, trade)
-        logger.debug(f"Stored trade with ID: {trade_id}")
-        ensure_trade_state(conn, trade_id)
+    # Upsert the trades and their state rows as two batched statements; lots
+    # reference trades, so these go in before the cost basis pass
+    trade_ids = store_trades(conn, trades, now=now)
+    logger.debug(f"Stored {len(trade_ids)} trades")
+    ensure_trade_states(conn, trade_ids, now=now)
 
+    for trade in trades:
         # Process cost basis for FIFO tracking
-        if trade.instruction and trade.order_id:
-            if "BUY" in trade.instruction.upper():
+        if trade.order_id:
+            if trade.side is TradeSide.BUY:
                 process_buy_order(
                     conn=conn,
                     order_id=trade.order_id,
@@ -58,7 +72,7 @@ def load_trade_orders(raw_orders=None, conn=None):
                     price=trade.price,
                     entered_time=trade.entered_time or ""
                 )
-            elif "SELL" in trade.instruction.upper():
+            elif trade.side is TradeSide.SELL:
                 process_sell_order(
                     conn=conn,
                     order_id=trade.order_id,
@@ -67,61 +81,94 @@ def load_trade_orders(raw_orders=None, conn=None):
                     sell_price=trade.price
                 )
 
+    # One commit for the whole batch: trades, lots and matches land together
     conn.commit()
 
 def send_unposted_trades(conn, config, unposted_trade_ids, positions_by_symbol):
-    for trade_id in unposted_trade_ids:
-        trade = load_trade_from_db(conn, trade_id)
-        if not trade:
-            continue
-
-        # Get position data - use underlying for position lookup
-        position_left = positions_by_symbol.get(trade.underlying, 0)
-        total_sold = get_total_sold(conn, trade.symbol)
-
-        # Get gain percentage for sell orders only
-        gain_pct = None
-        entry_price = None
-        if trade.instruction and "SELL" in trade.instruction.upper() and trade.order_id:
-            gain_pct = get_gain_for_order(conn, trade.order_id)
-            # Get entry price from lot matches if available
-            matches = get_matches_for_sell(conn, trade.order_id)
-            if matches:
-                # Weighted average entry price
-                total_qty = sum(m[2] for m in matches)
-                if total_qty > 0:
-                    entry_price = sum(m[2] * m[3] for m in matches) / total_qty
-
-        # Build message using Option Bot format (different for BUY vs SELL)
-        msg = build_option_bot_message(
-            trade,
-            position_left=position_left,
-            total_sold=total_sold,
-            gain_pct=gain_pct,
-            entry_price=entry_price
-        )
-
-        # Post to primary webhook
-        resp = post_webhook(config.discord_webhook, msg, timeout=config.schwab_timeout)
-        logger.debug(f"Posted trade ID {trade_id} to Discord (primary), response: {resp}")
-
-        # Post to secondary webhook if configured
-        webhook_2 = load_single_value("DISCORD_WEBHOOK_2", None)
-        if webhook_2:
-            resp2 = post_webhook(webhook_2, msg, timeout=config.schwab_timeout)
-            logger.debug(f"Posted trade ID {trade_id} to Discord (secondary), response: {resp2}")
-
-        with conn:
-            mark_posted(conn, trade_id, discord_message_id=None)
+    # Secondary webhook is optional; read it once for the whole batch
+    webhook_2 = load_single_value("DISCORD_WEBHOOK_2", None)
+
+    # One bulk load for the batch, kept in unposted order
+    trades_by_id = load_trades_from_db(conn, list(unposted_trade_ids))
+    trades = [
+        (trade_id, trades_by_id[trade_id])
+        for trade_id in unposted_trade_ids
+        if trade_id in trades_by_id
+    ]
+
+    # Posting doesn't change the trades table, so one query covers the whole batch
+    total_sold_by_symbol = get_total_sold_by_symbol(conn, {trade.symbol for _, trade in trades})
+
+    secondary = []
+    try:
+        for trade_id, trade in trades:
+            # Get position data - use underlying for position lookup
+            position_left = positions_by_symbol.get(trade.underlying, 0)
+            total_sold = total_sold_by_symbol.get(trade.symbol, 0)
+
+            # Get gain percentage for sell orders only
+            gain_pct = None
+            entry_price = None
+            if trade.side is TradeSide.SELL and trade.order_id:
+                # Quantity-weighted gain % and entry price, aggregated in SQL
+                gain_pct, entry_price = get_sell_averages(conn, trade.order_id)
+
+            # Build message using Option Bot format (different for BUY vs SELL)
+            msg = build_option_bot_message(
+                trade,
+                position_left=position_left,
+                total_sold=total_sold,
+                gain_pct=gain_pct,
+                entry_price=entry_price
+            )
+
+            # Post to primary webhook first: if it fails the trade stays unposted for
+            # the next poll, and nothing has gone to the secondary channel yet
+            resp = post_webhook(config.discord_webhook, msg, timeout=config.schwab_timeout)
+            logger.debug(f"Posted trade ID {trade_id} to Discord (primary), response: {resp}")
+
+            # Record the post before the secondary goes out, so no retry reposts either channel
+            with conn:
+                mark_posted(conn, trade_id, discord_message_id=None)
+
+            # Secondary webhook is optional; it posts on the background worker while the
+            # next trade is built and sent to the primary
+            if webhook_2:
+                secondary.append((trade_id, submit_webhook(webhook_2, msg, timeout=config.schwab_timeout)))
+    finally:
+        # Always wait for the secondary posts; a failure is logged, not retried,
+        # since the primary already has the message
+        for trade_id, future in secondary:
+            try:
+                resp2 = future.result()
+                logger.debug(f"Posted trade ID {trade_id} to Discord (secondary), response: {resp2}")
+            except Exception as e:
+                logger.error(f"Secondary Discord post failed for trade ID {trade_id}: {e}")
     conn.commit()
 
 
+def next_poll_delay(config, idle_polls: int) -> int:
+    """
+    Seconds to wait before the next poll: doubles per idle poll, capped at poll_max_interval.
+    With poll_max_interval at its default (== poll_interval) the interval stays fixed.
+    """
+    delay = config.poll_interval * 2 ** min(idle_polls, 16)
+    return min(delay, max(config.poll_max_interval, config.poll_interval))
+
+
+def count_idle_polls(idle_polls: int, raw_orders, last_raw_orders) -> int:
+    """Idle poll count after a poll: any new or changed order (posted or not) resets it to 0."""
+    return 0 if raw_orders != last_raw_orders else idle_polls + 1
+
+
 def main() -> None:
     config = load_config()
     setup_logging()
 
     os.makedirs(os.path.dirname(config.db_path) or ".", exist_ok=True)
     conn = sqlite3.connect(config.db_path)
+    # WAL with synchronous=NORMAL, a larger page cache and in-memory temp tables
+    tune_connection(conn)
     init_trades_db(config.db_path, conn)
     init_trade_state_db(config.db_path, conn)
     init_cost_basis_db(config.db_path, conn)
@@ -139,13 +186,16 @@ def main() -> None:
 
     logger.info(f"Client created: {client}")
 
+    idle_polls = 0
+    last_raw_orders = None
     while True:
         try:
             raw_orders = client.get_orders(config)
             load_trade_orders(raw_orders, conn)
 
             # Get current positions from Schwab
-            _, positions_by_symbol = get_schwab_positions(client)
+            positions = get_schwab_positions(client)
+            _, positions_by_symbol = positions
 
             unposted_trade_ids = get_unposted_trade_ids(conn)
             send_unposted_trades(conn, config, unposted_trade_ids, positions_by_symbol)
@@ -153,12 +203,16 @@ def main() -> None:
             # Auto-export to Excel when new trades are processed
             if unposted_trade_ids:
                 try:
-                    export_trades()
+                    # Reuse the positions fetched above instead of calling Schwab again
+                    export_trades(positions=positions)
                     logger.info(f"Excel export completed for {len(unposted_trade_ids)} new trades")
                 except Exception as e:
                     logger.warning(f"Excel export failed: {e}")
 
-            time.sleep(5)
+            # Back off only while Schwab returns the same orders
+            idle_polls = count_idle_polls(idle_polls, raw_orders, last_raw_orders)
+            last_raw_orders = raw_orders
+            time.sleep(next_poll_delay(config, idle_polls))
         except Exception as e:
             logger.error(f"Error in main loop (rebooting after 10 seconds): {e}", exc_info=True)
             time.sleep(10)
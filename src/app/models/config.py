@@ -15,6 +15,8 @@ class Config:
     call_on_auth: str | None
     time_delta_days: int
     status: str | None
+    poll_interval: int
+    poll_max_interval: int
 
 def _opt_str(key: str, alt = None) -> str | None:
     val = os.getenv(key)
@@ -35,6 +37,7 @@ def _opt_float(key: str, alt=None) -> float | None:
     return float(val) if val is not None and val != "" else alt
 
 def load_config() -> Config:
+    poll_interval = _opt_int("POLL_INTERVAL", 5)
     return Config(
         app_name=_opt_str("APP_NAME"),
         schwab_app_key=_opt_str("SCHWAB_APP_KEY"),
@@ -43,11 +46,14 @@ def load_config() -> Config:
         discord_webhook=_opt_str("DISCORD_WEBHOOK"),
         db_path=_opt_str("DB_PATH", "/data/trades.db"),
         callback_url=_opt_str("CALLBACK_URL"),
-        tokens_db=_opt_str("TOKENS_DB"),
+        tokens_db=_opt_str("TOKENS_DB", "/data/tokens.db"),
         schwab_timeout=_opt_int("SCHWAB_TIMEOUT",10),
         call_on_auth=_opt_str("CALL_ON_AUTH"),
         time_delta_days=_opt_int("TIME_DELTA_DAYS",7),
-        status=_opt_str("ORDER_STATUS")
+        status=_opt_str("ORDER_STATUS"),
+        poll_interval=poll_interval,
+        # Backoff is opt-in: unset means a fixed poll_interval
+        poll_max_interval=_opt_int("POLL_MAX_INTERVAL", poll_interval)
     )
 def load_single_value(key: str, alt=None):
     val = os.getenv(key)
@@ -1,4 +1,11 @@
-from dataclasses import dataclass# kept for consistent file style (not used here)
+from dataclasses import dataclass, field
+from enum import IntEnum
+
+class TradeSide(IntEnum):
+    """Side of an order, classified once from its instruction."""
+    BUY = 0
+    SELL = 1
+    OTHER = 2
 
 @dataclass(frozen=True)
 class Trade:
@@ -15,6 +22,40 @@ class Trade:
     status: str | None
     entered_time: str | None
     close_time: str | None
+    # Derived from instruction, so callers branch on a tag instead of re-scanning the string
+    side: TradeSide = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        object.__setattr__(self, "side", trade_side(self.instruction))
+
+# Known Schwab order-leg instructions by side
+_INSTRUCTION_SIDE = {
+    "BUY": TradeSide.BUY,
+    "BUY_TO_OPEN": TradeSide.BUY,
+    "BUY_TO_CLOSE": TradeSide.BUY,
+    "BUY_TO_COVER": TradeSide.BUY,
+    "SELL": TradeSide.SELL,
+    "SELL_TO_OPEN": TradeSide.SELL,
+    "SELL_TO_CLOSE": TradeSide.SELL,
+    "SELL_SHORT": TradeSide.SELL,
+    "SELL_SHORT_EXEMPT": TradeSide.SELL,
+}
+
+def trade_side(instruction: str | None) -> TradeSide:
+    """Classify an order instruction as BUY, SELL or OTHER."""
+    if not instruction:
+        return TradeSide.OTHER
+    side = _INSTRUCTION_SIDE.get(instruction)
+    if side is None:
+        # Unlisted or differently cased instruction: fall back to a substring check
+        upper = instruction.upper()
+        if "BUY" in upper:
+            side = TradeSide.BUY
+        elif "SELL" in upper:
+            side = TradeSide.SELL
+        else:
+            side = TradeSide.OTHER
+    return side
 
 def load_trade(data: dict) -> Trade:
     leg = (data.get("orderLegCollection") or [{}])[0]
@@ -0,0 +1,52 @@
+import pytest
+
+from app.cost_basis import (
+    extract_underlying,
+    parse_expiration,
+    parse_option_description,
+    parse_strike_display,
+)
+
+
+@pytest.mark.parametrize(
+    "description, expected",
+    [
+        ("ORACLE CORP 02/13/2026 $149 Call", ("02/13/2026", "149c")),
+        ("APPLE INC 02/20/2026 $267.5 Put", ("02/20/2026", "267.5p")),
+        ("APPLE INC 02/20/2026 $267.5 PUT ", ("02/20/2026", "267.5p")),
+        ("  ORACLE CORP 02/13/2026 $149 Call\n", ("02/13/2026", "149c")),
+        ("", ("N/A", "N/A")),
+    ],
+)
+def test_parse_option_description(description, expected):
+    assert parse_option_description(description) == expected
+
+
+@pytest.mark.parametrize(
+    "description",
+    [
+        "ORACLE CORP 02/13/2026 $149 Call",
+        "SOME CORP 02/13/2026 AB12 Call",
+        "SOME CORP 02/13/2026 $5 Straddle",
+        "NOT AN OPTION",
+        " APPLE INC 02/20/2026 $267.5 Put ",
+    ],
+)
+def test_parse_option_description_matches_individual_parsers(description):
+    assert parse_option_description(description) == (
+        parse_expiration(description),
+        parse_strike_display(description),
+    )
+
+
+@pytest.mark.parametrize(
+    "symbol, expected",
+    [
+        ("AAPL  260220C00267500", "AAPL"),
+        (" AAPL  260220C00267500", "AAPL"),
+        ("AAPL ", "AAPL"),
+        ("BRK.B", "BRK.B"),
+    ],
+)
+def test_extract_underlying(symbol, expected):
+    assert extract_underlying(symbol) == expected
@@ -0,0 +1,139 @@
+import json
+import sqlite3
+
+import openpyxl
+import pytest
+
+import export_trades
+from app.cost_basis import process_buy_order, process_sell_order
+from app.db.cost_basis_db import init_cost_basis_db
+from app.db.trades_db import init_trades_db
+from app.db.trades_repo import store_trades
+from app.models.data import Trade
+
+SYMBOL = "AAPL  260220C00267500"
+DESCRIPTION = "APPLE INC 02/20/2026 $267.5 Call"
+NO_POSITIONS = ([], {})
+
+
+def make_trade(order_id, instruction, quantity, price, entered_time):
+    return Trade(
+        order_id=order_id,
+        symbol=SYMBOL,
+        underlying="AAPL",
+        instruction=instruction,
+        description=DESCRIPTION,
+        asset_type="OPTION",
+        price=price,
+        quantity=quantity,
+        filled_quantity=quantity,
+        remaining_quantity=0,
+        status="FILLED",
+        entered_time=entered_time,
+        close_time=entered_time,
+    )
+
+
+def add_trades(db_path, trades):
+    conn = sqlite3.connect(db_path)
+    store_trades(conn, trades)
+    for trade in trades:
+        if trade.instruction.startswith("BUY"):
+            process_buy_order(conn, trade.order_id, trade.symbol, trade.filled_quantity,
+                              trade.price, trade.entered_time)
+        else:
+            process_sell_order(conn, trade.order_id, trade.symbol, trade.filled_quantity, trade.price)
+    conn.commit()
+    conn.close()
+
+
+def write_legacy_workbook(path):
+    """A January workbook as written before the ledger: one buy plus the totals row."""
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.append(export_trades.TRADE_HEADERS)
+    ws.append([SYMBOL, "OPTION", "BUY_TO_OPEN", 2, 2, 0, 2.0, "FILLED",
+               "2026-01-02T14:30:00+0000", "2026-01-02T14:30:00+0000", DESCRIPTION, -400, None])
+    ws.append([None] * 10 + ["TOTAL P/L:", -400])
+    wb.save(path)
+
+
+def read_trades_sheet(path):
+    ws = openpyxl.load_workbook(path).worksheets[0]
+    rows = list(ws.iter_rows(min_row=2, values_only=True))
+    return rows[:-1], rows[-1]
+
+
+def read_ledger_lines(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+@pytest.fixture
+def export_env(tmp_path, monkeypatch):
+    db_path = str(tmp_path / "trades.db")
+    init_trades_db(db_path)
+    init_cost_basis_db(db_path)
+
+    monkeypatch.setattr(export_trades, "DB_PATH", db_path)
+    monkeypatch.setattr(export_trades, "OUTPUT_DIR", str(tmp_path))
+    monkeypatch.setattr(export_trades, "EXPORT_FORMAT", "xlsx")
+    yield tmp_path, db_path
+    export_trades.close_export_connections()
+
+
+def test_ledger_seeded_from_legacy_workbook_then_appended(export_env):
+    tmp_path, db_path = export_env
+    xlsx_path = tmp_path / "trades_2026-01.xlsx"
+    ledger_path = tmp_path / "trades_2026-01.jsonl"
+    write_legacy_workbook(xlsx_path)
+
+    # The legacy buy is also in the database; only the sell is new
+    add_trades(db_path, [
+        make_trade(1, "BUY_TO_OPEN", 2, 2.0, "2026-01-02T14:30:00+0000"),
+        make_trade(2, "SELL_TO_CLOSE", 1, 3.0, "2026-01-05T15:00:00+0000"),
+    ])
+    export_trades.export_trades(2026, 1, positions=NO_POSITIONS)
+
+    ledger = read_ledger_lines(ledger_path)
+    assert [row[8] for row in ledger] == ["2026-01-02T14:30:00+0000", "2026-01-05T15:00:00+0000"]
+    assert ledger[1][11] == 300
+    assert ledger[1][12] == pytest.approx(50.0)
+
+    trades, total = read_trades_sheet(xlsx_path)
+    assert [row[11] for row in trades] == [-400, 300]
+    assert trades[1][12] == pytest.approx(0.5)
+    assert total[10:12] == ("TOTAL P/L:", -100)
+
+    # A later sell is appended once; re-exporting adds nothing
+    add_trades(db_path, [make_trade(3, "SELL_TO_CLOSE", 1, 1.0, "2026-01-06T15:00:00+0000")])
+    export_trades.export_trades(2026, 1, positions=NO_POSITIONS)
+    export_trades.export_trades(2026, 1, positions=NO_POSITIONS)
+
+    ledger = read_ledger_lines(ledger_path)
+    entry_dates = [row[8] for row in ledger]
+    assert len(entry_dates) == len(set(entry_dates)) == 3
+
+    trades, total = read_trades_sheet(xlsx_path)
+    assert [row[11] for row in trades] == [-400, 300, 100]
+    assert total[10:12] == ("TOTAL P/L:", 0)
+
+
+def test_unchanged_export_skips_rebuild(export_env, monkeypatch):
+    tmp_path, db_path = export_env
+    add_trades(db_path, [make_trade(1, "BUY_TO_OPEN", 2, 2.0, "2026-01-02T14:30:00+0000")])
+    export_trades.export_trades(2026, 1, positions=NO_POSITIONS)
+
+    rebuilds = []
+    write_trades_sheet = export_trades.write_trades_sheet
+    monkeypatch.setattr(export_trades, "write_trades_sheet",
+                        lambda ws, trades: rebuilds.append(len(trades)) or write_trades_sheet(ws, trades))
+
+    export_trades.export_trades(2026, 1, positions=NO_POSITIONS)
+    assert rebuilds == []
+
+    # New positions change what the workbook shows, so it is rebuilt
+    positions = ([{"symbol": SYMBOL, "asset_type": "OPTION", "quantity": 2,
+                   "avg_price": 2.0, "market_value": 400.0}], {"AAPL": 2})
+    export_trades.export_trades(2026, 1, positions=positions)
+    assert rebuilds == [1]
@@ -0,0 +1,43 @@
+from types import SimpleNamespace
+
+import pytest
+
+from app.main import count_idle_polls, next_poll_delay
+from app.models.config import load_config
+
+
+@pytest.mark.parametrize(
+    "poll_interval, poll_max_interval, expected",
+    [
+        (5, 5, [5, 5, 5, 5, 5]),
+        (5, 30, [5, 10, 20, 30, 30]),
+        (5, 3, [5, 5, 5, 5, 5]),
+    ],
+)
+def test_next_poll_delay(poll_interval, poll_max_interval, expected):
+    config = SimpleNamespace(poll_interval=poll_interval, poll_max_interval=poll_max_interval)
+    assert [next_poll_delay(config, idle_polls) for idle_polls in range(5)] == expected
+
+
+def test_next_poll_delay_stays_capped_after_long_idle():
+    config = SimpleNamespace(poll_interval=5, poll_max_interval=30)
+    assert next_poll_delay(config, 10_000) == 30
+
+
+def test_count_idle_polls():
+    orders = [{"orderId": 1, "status": "WORKING"}]
+
+    assert count_idle_polls(0, orders, None) == 0
+    assert count_idle_polls(2, orders, list(orders)) == 3
+    # A status change resets the backoff even though nothing new gets posted
+    assert count_idle_polls(3, [{"orderId": 1, "status": "FILLED"}], orders) == 0
+
+
+def test_poll_backoff_is_opt_in(monkeypatch):
+    monkeypatch.setenv("POLL_INTERVAL", "7")
+    monkeypatch.delenv("POLL_MAX_INTERVAL", raising=False)
+    config = load_config()
+    assert config.poll_max_interval == config.poll_interval == 7
+
+    monkeypatch.setenv("POLL_MAX_INTERVAL", "30")
+    assert load_config().poll_max_interval == 30